@@ -0,0 +1,47 @@
+"""Adds pigment rgb and hex
+
+Revision ID: d41ca6c9eac7
+Revises: b030940723f5
+Create Date: 2026-10-18 13:40:12.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from lib.color import SpectrumBatch
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41ca6c9eac7'
+down_revision = 'b030940723f5'
+branch_labels = None
+depends_on = None
+
+
+pigments = sa.table('pigments',
+                    sa.column('id', sa.Integer),
+                    sa.column('spectrum', sa.ARRAY(sa.Float)),
+                    sa.column('rgb', sa.ARRAY(sa.Float)),
+                    sa.column('hex', sa.String))
+
+
+def upgrade():
+    op.add_column('pigments', sa.Column('rgb', sa.ARRAY(sa.Float()), nullable=True))
+    op.add_column('pigments', sa.Column('hex', sa.String(length=6), nullable=True))
+
+    # Backfill, converting every spectrum in one batch.
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([pigments.c.id, pigments.c.spectrum]).where(pigments.c.spectrum.isnot(None))
+    ).fetchall()
+    if rows:
+        batch = SpectrumBatch([spectrum for _, spectrum in rows])
+        converted = zip(batch.to_rgb().tolist(), batch.to_hex())
+        for (pigment_id, _), (rgb, hex) in zip(rows, converted):
+            connection.execute(
+                pigments.update().where(pigments.c.id == pigment_id).values(rgb=rgb, hex=hex))
+
+
+def downgrade():
+    op.drop_column('pigments', 'hex')
+    op.drop_column('pigments', 'rgb')
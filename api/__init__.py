@@ -1,4 +1,5 @@
 from api.flask_app import flask_app as app
 import api.models
+import api.request_metrics
 import api.v1
 import api.api_routes
@@ -1,5 +1,5 @@
 from api.db import db, Model
-from lib.color import Color
+from lib.color import Color, SpectrumBatch
 from api.routing import route_for
 
 
@@ -9,8 +9,22 @@ class Pigment(Model, db.Model):
     id = db.Column(db.Integer,
                    db.Sequence('pigments_id_seq'),
                    primary_key=True)
-    spectrum = db.Column(db.ARRAY(db.Float))
+    # Listing pigments never needs the spectrum, so it's only loaded
+    # when something asks for it.
+    spectrum = db.deferred(db.Column(db.ARRAY(db.Float)))
     name = db.Column(db.String)
+    # Worked out from the spectrum whenever it's set; see rgb_for.
+    rgb = db.Column(db.ARRAY(db.Float))
+    hex = db.Column(db.String(6))
+
+    @db.validates('spectrum')
+    def update_rgb(self, key, spectrum):
+        if spectrum is None:
+            self.rgb, self.hex = None, None
+            return None
+        spectrum = [float(x) for x in spectrum]
+        self.rgb, self.hex = rgb_for([spectrum])[0]
+        return spectrum
 
     def color(self):
         return Color(self.spectrum, 1, self.name)
@@ -18,8 +32,8 @@ class Pigment(Model, db.Model):
     def short_dict(self):
         return {
             'id': self.id,
-            'rgb': self.color().to_rgb(),
-            'hex': self.color().to_hex(),
+            'rgb': self.rgb,
+            'hex': self.hex,
             'name': self.name,
             'url': route_for('pigment', pigment_id=self.id)
         }
@@ -27,14 +41,20 @@ class Pigment(Model, db.Model):
     def full_dict(self):
         return {
             'id': self.id,
-            'rgb': self.color().to_rgb(),
-            'hex': self.color().to_hex(),
+            'rgb': self.rgb,
+            'hex': self.hex,
             'name': self.name,
             'spectrum': self.spectrum,
             'url': route_for('pigment', pigment_id=self.id)
         }
 
 
+def rgb_for(spectra):
+    """The stored (rgb, hex) of each of `spectra`, converted together."""
+    batch = SpectrumBatch(spectra)
+    return list(zip(batch.to_rgb().tolist(), batch.to_hex()))
+
+
 class PigmentQuery(db.Query):
     pass
 
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from api.models import Pigment
+import lib.color as color
+import lib.observers as observers
+
+# The pigment catalog is small and hardly ever changes, so each process
+# keeps the whole thing in memory: spectra and log spectra as rows of
+# contiguous arrays, found by id, loaded in one query. Committing a
+# change to a pigment bumps the store's version, so the next lookup
+# reloads; changes made by other processes (seeding, say) are picked up
+# within PIGMENT_STORE_TTL seconds.
+#
+# The catalog also holds the pigment list as /v1/pigments shows it
+# (every pigment, with a spectrum or not), tagged with a digest taken
+# when it's loaded. The same pigments get the same tag in every
+# process, so it makes an ETag that holds across workers and restarts.
+
+TTL = float(os.environ.get('PIGMENT_STORE_TTL', 300))
+
+
+class UnknownPigment(KeyError): pass
+
+
+class PigmentCatalog():
+    """Every pigment at one moment; never changes once loaded."""
+    def __init__(self, ids, names, spectra, version, listing=()):
+        self.ids = np.asarray(ids, dtype=int)
+        self.names = list(names)
+        self.spectra = np.array(spectra, dtype=color.SPECTRUM_DTYPE).reshape(len(self.ids), len(observers.frequencies))
+        self.log_spectra = color.log_spectrum(self.spectra)
+        self.spectra.setflags(write=False)
+        self.log_spectra.setflags(write=False)
+        self.rows_by_id = np.full(self.ids.max() + 1 if len(self.ids) else 0, -1)
+        self.rows_by_id[self.ids] = np.arange(len(self.ids))
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # (id, name, rgb, hex) of every pigment.
+        self.listing = [tuple(row) for row in listing]
+        self.tag = hashlib.sha1(json.dumps(self.listing).encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, pigment_ids):
+        """Rows of the arrays for `pigment_ids`; raises UnknownPigment."""
+        rows = []
+        for pigment_id in pigment_ids:
+            try:
+                index = int(pigment_id)
+                # int() would quietly make 2.7 into pigment 2 (and True into 1).
+                integral = isinstance(pigment_id, str) or index == pigment_id
+                if index < 0 or not integral or isinstance(pigment_id, bool):
+                    raise ValueError(pigment_id)
+                row = int(self.rows_by_id[index])
+            except (IndexError, OverflowError, TypeError, ValueError):
+                row = -1
+            if row < 0:
+                raise UnknownPigment(pigment_id)
+            rows.append(row)
+        return rows
+
+    def color(self, row, proportion=1):
+        return color.Color(self.spectra[row], proportion, self.names[row],
+                           log_spectrum=self.log_spectra[row])
+
+
+class PigmentStore():
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def stale(self, catalog):
+        return (catalog is None or catalog.version != self.version or
+                time.monotonic() - catalog.loaded_at > self.ttl)
+
+    def catalog(self):
+        catalog = self._catalog
+        if self.stale(catalog):
+            with self._lock:
+                catalog = self._catalog
+                if self.stale(catalog):
+                    catalog = self._catalog = self.load(self.version)
+        return catalog
+
+    def load(self, version):
+        found = (Pigment.query
+                 .with_entities(Pigment.id, Pigment.name, Pigment.rgb, Pigment.hex, Pigment.spectrum)
+                 .order_by(Pigment.id)
+                 .all())
+        mixable = [p for p in found if p.spectrum is not None]
+        return PigmentCatalog([p.id for p in mixable], [p.name for p in mixable],
+                              [p.spectrum for p in mixable], version,
+                              [(p.id, p.name, p.rgb, p.hex) for p in found])
+
+
+pigment_store = PigmentStore()
+
+
+def pigment_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['pigments_changed'] = True
+
+for change in ['after_insert', 'after_update', 'after_delete']:
+    event.listen(Pigment, change, pigment_changed)
+
+@event.listens_for(Session, 'after_commit')
+def pigments_committed(session):
+    if session.info.pop('pigments_changed', False):
+        pigment_store.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def pigments_rolled_back(session):
+    session.info.pop('pigments_changed', None)
@@ -0,0 +1,36 @@
+import time
+
+from flask import g, request
+
+from api import app
+import lib.metrics as metrics
+import lib.munsell as munsell
+
+# Latency and Munsell index lookups, per route. Streamed responses are
+# timed until they start, not until they finish.
+
+request_latency = metrics.Histogram(
+    'http_request_duration_seconds', "Time to handle a request, by route.",
+    labels=['endpoint', 'method', 'status'])
+lookups_per_request = metrics.Histogram(
+    'munsell_index_lookups_per_request', "Single-sample lattice lookups made by a request.",
+    buckets=metrics.COUNT_BUCKETS, labels=['endpoint'])
+
+
+@app.before_request
+def start_request_metrics():
+    if metrics.enabled:
+        g.metrics_start = time.perf_counter()
+        munsell.request_lookups.take()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        request_latency.observe(
+            time.perf_counter() - start, (endpoint, request.method, str(response.status_code)))
+        lookups_per_request.observe(munsell.request_lookups.take(), (endpoint,))
+        metrics.flush()
+    return response
@@ -0,0 +1,208 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import current_app, request
+
+from lib.lru import LRUCache
+from lib.munsell import ARTIFACT_VERSION, artifact_name, numerical_hue, parse_name
+
+# Munsell responses are pure functions of their query strings, so the
+# rendered JSON is cached, keyed on the route and its parameters with
+# colors and hues as the numbers they parse to ("5R 3/7" and
+# "5.0R 3.0/7.0" are the same color). There are two tiers: an LRU in
+# each worker, and a SQLite file every worker on the box shares, each
+# kept under so many bytes by dropping the least recently used.
+# Responses go out with a strong ETag and a Cache-Control header, so
+# browsers and CDNs can keep them too.
+#
+# The key includes the database's artifact name and version, so
+# rebuilding the colors (or switching precision) starts afresh. A new
+# deploy can change what a route says without touching the colors, so
+# the server empties the shared tier when it starts (see
+# gunicorn.conf.py); and nothing is served from either tier once it's
+# older than the max-age it went out with.
+
+MEMORY_BYTES = int(os.environ.get('RESPONSE_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+SHARED_PATH = os.environ.get(
+    'RESPONSE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'palette-responses.sqlite3'))
+SHARED_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 256 * 1024 * 1024))
+# Anything bigger (a 100x100 atlas, say) is cheaper to remake than to hoard.
+MAX_ENTRY_BYTES = 4 * 1024 * 1024
+MAX_AGE = int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 86400))
+
+
+# Keys hold the numbers the routes will work with, in full, rather than
+# display names (which round to one place and would mix up 3/7 and
+# 3.04/7).
+def normalized_name(name):
+    try:
+        hue, value, chroma = parse_name(name)
+        return repr((numerical_hue(hue), value, chroma))
+    except ValueError:
+        return name
+
+def normalized_hue(hue):
+    try:
+        return repr(numerical_hue(hue))
+    except (KeyError, ValueError):
+        return hue
+
+
+class SharedStore():
+    """Rendered responses in a SQLite file, shared by every process that
+    opens it. A cache, not a database: nothing here is worth an fsync,
+    and any trouble with the file just means a miss."""
+    # Files from before the table last changed are started over.
+    SCHEMA = 2
+
+    def __init__(self, path=SHARED_PATH, max_bytes=SHARED_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            if connection.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA:
+                connection.execute("DROP TABLE IF EXISTS responses")
+                connection.execute("PRAGMA user_version = {0}".format(self.SCHEMA))
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, etag TEXT, body BLOB, size INTEGER, made REAL, used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        try:
+            connection = self.connection()
+            row = connection.execute(
+                "SELECT etag, body, made FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+                return row[0], bytes(row[1]), row[2]
+        except sqlite3.Error:
+            pass
+        return None
+
+    def put(self, key, etag, body, made):
+        try:
+            connection = self.connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, etag, body, len(body), made, time.time()))
+            self.evict(connection)
+        except sqlite3.Error:
+            pass
+
+    def evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        # Oldest first, until enough is gone.
+        doomed = []
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY used"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        try:
+            self.connection().execute("DELETE FROM responses")
+        except sqlite3.Error:
+            pass
+
+    def remove(self):
+        """Delete the file; for when the server starts."""
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
+
+
+memory = LRUCache(MEMORY_BYTES, sizeof=lambda found: len(found[1]))
+shared = SharedStore()
+
+
+def cache_key(names=(), hues=()):
+    params = []
+    for key in sorted(request.args):
+        for value in request.args.getlist(key):
+            if key in names:
+                value = normalized_name(value)
+            elif key in hues:
+                value = normalized_hue(value)
+            params.append("{0}={1}".format(key, value))
+    return "{0}-v{1}:{2}?{3}".format(artifact_name(), ARTIFACT_VERSION, request.endpoint, "&".join(params))
+
+
+def wants_json():
+    """Whether Flask-API would render JSON (rather than the browsable
+    API, or something else) for this request."""
+    accept = request.accept_mimetypes
+    return not accept or accept.best_match(['application/json', 'text/html']) == 'application/json'
+
+
+def fresh(found):
+    return found is not None and time.time() - found[2] < MAX_AGE
+
+
+def respond(etag, body, made):
+    headers = {
+        'ETag': '"{0}"'.format(etag),
+        'Cache-Control': 'public, max-age={0}'.format(MAX_AGE),
+        # Only what's sent to JSON-accepting clients is cached.
+        'Vary': 'Accept',
+    }
+    if request.if_none_match.contains(etag):
+        return current_app.response_class(status=304, headers=headers)
+    return current_app.response_class(body, headers=headers, content_type='application/json')
+
+
+def cached(names=(), hues=(), unless=()):
+    """Cache a GET route's JSON responses. `names` are the parameters that
+    hold Munsell designations, and `hues` those that hold hues; requests
+    with any of the parameters in `unless` (ones that depend on the
+    database, say) aren't cached.
+
+    Only plain JSON responses are cached; the browsable API, streams
+    and errors go straight through."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or any(key in request.args for key in unless) or not wants_json():
+                return view(*args, **kwargs)
+            key = cache_key(names, hues)
+            found = memory.get(key)
+            if not fresh(found):
+                found = shared.get(key)
+                if fresh(found):
+                    memory.put(key, found)
+            if fresh(found):
+                return respond(*found)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if (response.status_code != 200 or response.mimetype != 'application/json' or
+                    response.is_streamed):
+                return response
+            body = response.get_data()
+            if len(body) > MAX_ENTRY_BYTES:
+                return response
+            found = (hashlib.sha256(body).hexdigest()[:32], body, time.time())
+            memory.put(key, found)
+            shared.put(key, *found)
+            return respond(*found)
+        return wrapper
+    return decorator
@@ -1,6 +1,8 @@
 import api.v1.pigment_routes
 import api.v1.mix_routes
+import api.v1.recipe_routes
 import api.v1.munsell
+import api.v1.metrics_routes
 from api import app
 from api.routing import route_for
 from flask import request
@@ -15,5 +17,7 @@ def v1_api_routes():
         return {
             'pigments': route_for('pigments'),
             'mixes': route_for('mixes'),
+            'recipes': route_for('recipes_for', color="5.0PB 4/8"),
             'munsell': route_for('munsell_routes'),
+            'metrics': route_for('metrics_for_prometheus'),
         }
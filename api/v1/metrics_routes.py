@@ -0,0 +1,18 @@
+from api import app
+from flask import Response, abort
+
+import lib.metrics as metrics
+
+PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@app.route("/v1/metrics", methods=['GET'])
+def metrics_for_prometheus():
+    """
+    Counters and histograms for the color engine and every route,
+    added up over all the server's workers, in the Prometheus text
+    format.
+    """
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(metrics.collect()), content_type=PROMETHEUS)
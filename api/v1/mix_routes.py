@@ -1,7 +1,7 @@
 from api import app
-from flask import request
+from flask import request, abort
 from flask_api import FlaskAPI, status, exceptions
-from api.models import Pigment
+from api.pigment_store import pigment_store, UnknownPigment
 
 from lib.color import Mix
 
@@ -29,12 +29,24 @@ def mixes():
     """
     if request.method == 'POST':
         data = request.data
-        pigments = data['pigments']
-        colors = [Pigment.query.get(p['id']).color().p(p['proportion']) for p in pigments]
-        mix = Mix(colors).to_color()
+        pigments = data.get('pigments') if isinstance(data, dict) else None
+        try:
+            ids = [p['id'] for p in pigments]
+            proportions = [float(p['proportion']) for p in pigments]
+        except (KeyError, TypeError, ValueError):
+            abort(422, "You must specify `pigments`, each with an `id` and a `proportion`")
+        if not pigments:
+            abort(422, "You must specify `pigments`, each with an `id` and a `proportion`")
+
+        catalog = pigment_store.catalog()
+        try:
+            rows = catalog.rows(ids)
+        except UnknownPigment as e:
+            abort(404, "There's no pigment {0}".format(e.args[0]))
+        mix = Mix([catalog.color(row, proportion) for row, proportion in zip(rows, proportions)])
         return {
             'pigments': pigments,
-            'rgb': mix.to_rgb().tolist(),
+            'rgb': mix.to_rgb(),
             'hex': mix.to_hex(),
             'spectrum': mix.spectrum.tolist(),
             'name': mix.name
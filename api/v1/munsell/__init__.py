@@ -33,8 +33,13 @@ def munsell_routes():
             'complement': route_for('complement', color="5.0R 3/7"),
             'sunlight': route_for('sunlight', color="5.0R 3/7"),
             'shadow': route_for('shadow', color="5.0R 3/7"),
+            'colors': route_for('bulk_colors'),
             'ladder': route_for('ladder', start_color="5.0R 3/7", end_color="7.0GY 8/10", steps=5),
             'mix': route_for('munsell_mix', a_color="5.0R 3/7", b_color="7.0GY 8/10"),
+            'neutralize': route_for('neutralize', a_color="5.0R 5/6", b_color="5.0BG 5/6"),
             'rainbow': route_for('munsell_rainbow', value=5, chroma=10, steps=10),
             'page': route_for('munsell_page', hue="5.0R"),
+            'atlas': route_for('munsell_atlas'),
+            'gamut': route_for('munsell_gamut', hue="5.0R"),
+            'nearest': route_for('nearest', hex="#7a3135"),
         }
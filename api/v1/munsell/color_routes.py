@@ -1,17 +1,64 @@
 from api import app
-from flask import request, abort
+from flask import request, abort, Response, stream_with_context
 from flask_api import FlaskAPI, status, exceptions
-from lib.munsell import color_from_name, numerical_ladder, mix_ladder, rainbow, page
-from lib.color import Mix
+from lib.munsell import (color_from_name, ladder_stats, ladder_span, rainbow_stats, rainbow_span,
+                         stats_spans, gamut_stats,
+                         name_for_hue, page_stats, ATLAS_HUES, MissingColorError, resolve,
+                         shadow_mix, nearest_index)
+from lib.offload import Busy, TimedOut
+from lib.color import Mix, stats_dicts, neutral_proportions, lab, linear_rgb_for_hex
+import json
+import numpy as np
+from api.pigment_store import pigment_store, UnknownPigment
+from api.response_cache import cached
+
+NDJSON = "application/x-ndjson"
 
 
 def color(key="color"):
     name = request.args.get(key)
     if not name:
         abort(422, "You must specify a `{0}`".format(key))
-    return color_from_name(name)
+    try:
+        return color_from_name(name)
+    except ValueError as e:
+        abort(422, str(e))
+
+def streaming():
+    """Whether the client asked for newline-delimited JSON, with
+    `?stream=1` or by accepting application/x-ndjson."""
+    return (request.args.get("stream") in ("1", "true") or
+            request.accept_mimetypes.best == NDJSON)
+
+def ndjson(chunks):
+    """A response streamed out as newline-delimited JSON, one line per
+    item, written a chunk at a time as `chunks` produces them."""
+    def lines():
+        for chunk in chunks:
+            yield "".join(json.dumps(item) + "\n" for item in chunk)
+    return Response(stream_with_context(lines()), mimetype=NDJSON)
+
+@app.errorhandler(Busy)
+@app.errorhandler(TimedOut)
+def compute_unavailable(e):
+    # Big pages, ladders and rainbows go to the compute pool (see
+    # lib/offload.py), which turns work away when it's swamped.
+    return app.response_class(
+        json.dumps({'message': str(e)}), status=503, headers={'Retry-After': '1'},
+        content_type='application/json')
+
+def color_or_pigment(prefix):
+    pigment_id = request.args.get(prefix + "_pigment")
+    if pigment_id:
+        catalog = pigment_store.catalog()
+        try:
+            return catalog.color(catalog.rows([pigment_id])[0])
+        except UnknownPigment:
+            abort(404, "There's no pigment {0}".format(pigment_id))
+    return color(prefix + "_color")
 
 @app.route("/v1/munsell/color", methods=['GET'])
+@cached(names=['color'])
 def plain_color():
     """Fetch a color by its munsell designation.
 
@@ -38,6 +85,7 @@ def plain_color():
 
 
 @app.route("/v1/munsell/color/sunlight", methods=['GET'])
+@cached(names=['color'])
 def sunlight():
     """A color hightened in value and warmth, as if in sunlight.
 
@@ -47,6 +95,7 @@ def sunlight():
 
 
 @app.route("/v1/munsell/color/shadow", methods=['GET'])
+@cached(names=['color'])
 def shadow():
     """A color lowered in value and warmth, as if in shadow.
 
@@ -56,6 +105,7 @@ def shadow():
 
 
 @app.route("/v1/munsell/color/complement", methods=['GET'])
+@cached(names=['color'])
 def complement():
     """The equal-chroma (or as close as possible) complement of a color.
 
@@ -69,25 +119,187 @@ def complement():
         return color().complement().stats_dict()
 
 
+MAX_BULK_COLORS = 1000
+# Each transform gives the colors to resolve, and how to make the result
+# out of them once they are.
+TRANSFORMS = {
+    None: (lambda c: [c], lambda c: c),
+    'sunlight': (lambda c: [c.in_sunlight()], lambda c: c),
+    'shadow': (lambda c: list(c.shadow_parts()), shadow_mix),
+    'complement': (lambda c: [c.complement()], lambda c: c),
+}
+
+def bulk_item(item):
+    """The colors an item of a bulk request needs resolved, and how to
+    make the color it asks for from them."""
+    if isinstance(item, dict):
+        name, transform = item.get('color'), item.get('transform')
+    else:
+        name, transform = item, None
+    if not (transform is None or isinstance(transform, str)) or transform not in TRANSFORMS:
+        raise ValueError("Unknown transform {0!r}".format(transform))
+    parts, make = TRANSFORMS[transform]
+    return parts(color_from_name(name)), make
+
+def error_message(e):
+    # MissingColorError carries the hue, value and chroma after its message.
+    return str(e.args[0]) if e.args else "Color not found"
+
+@app.route("/v1/munsell/colors", methods=['POST'])
+def bulk_colors():
+    """Fetch many colors at once. POST a list of `colors`, each either a
+    munsell designation or an object with a `color` and an optional
+    `transform` -- one of "sunlight", "shadow" or "complement":
+
+    <code>{
+      "colors": ["5.0R 3/7", {"color": "7.0PB 6/14", "transform": "shadow"}]
+    }</code>
+
+    Returns one entry per color, in order, shaped like
+    /v1/munsell/color. A color that can't be read or found gets an
+    entry with an `error` instead, and doesn't fail the rest.
+
+    """
+    if request.method == 'POST':
+        items = request.data.get('colors') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            abort(422, "You must specify a list of `colors`")
+        if len(items) > MAX_BULK_COLORS:
+            abort(422, "You can ask for at most {0} colors at once".format(MAX_BULK_COLORS))
+
+        results = []
+        for item in items:
+            try:
+                results.append(bulk_item(item))
+            except (ValueError, TypeError, MissingColorError) as e:
+                results.append(e)
+        resolve([c for r in results if not isinstance(r, Exception) for c in r[0]])
+
+        good = []
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                continue
+            parts, make = result
+            try:
+                results[i] = make(*parts)
+                results[i].spectrum
+            except MissingColorError as e:
+                results[i] = e
+                continue
+            good.append(i)
+
+        out = [{'color': item, 'error': error_message(result)}
+               if isinstance(result, Exception) else None
+               for item, result in zip(items, results)]
+        for i, stats in zip(good, stats_dicts(results[i] for i in good)):
+            out[i] = stats
+        return out
+
+
+MAX_NEAREST = 20
+
+@app.route("/v1/munsell/nearest", methods=['GET', 'POST'])
+@cached()
+def nearest():
+    """The Munsell colors nearest a `hex` code, like "#7a3135", nearest
+    first. `k` sets how many (default 1, up to 20); each comes with its
+    `distance` (delta E, in CIELAB).
+
+    POST to look up many at once: either a list of `hex` codes, or a
+    list of `spectra` -- 36 reflectances each, from 380nm to 730nm in
+    10nm steps -- which are matched spectrally rather than by how they
+    look. You get back a list of matches for each.
+
+    <code>{
+      "hex": ["#7a3135", "#005551"],
+      "k": 3
+    }</code>
+
+    """
+    data = request.data if request.method == 'POST' else request.args
+    if not isinstance(data, dict):
+        abort(422, "You must specify `hex` codes or `spectra`")
+    try:
+        k = int(data.get("k") or 1)
+    except (TypeError, ValueError):
+        k = 0
+    if not 1 <= k <= MAX_NEAREST:
+        abort(422, "`k` must be between 1 and {0}".format(MAX_NEAREST))
+
+    codes = data.get("hex")
+    spectra = data.get("spectra") if request.method == 'POST' else None
+    if request.method == 'GET':
+        if not codes:
+            abort(422, "You must specify a `hex` code")
+        codes = [codes]
+    inputs = codes if codes is not None else spectra
+    if not isinstance(inputs, list) or not inputs:
+        abort(422, "You must specify a list of `hex` codes or `spectra`")
+    if len(inputs) > MAX_BULK_COLORS:
+        abort(422, "You can look up at most {0} colors at once".format(MAX_BULK_COLORS))
+
+    if codes is not None:
+        try:
+            found = nearest_index.nearest_to_lab(lab(linear_rgb_for_hex(codes)), k)
+        except ValueError as e:
+            abort(422, str(e))
+    else:
+        try:
+            spectra = np.array(spectra, dtype=float)
+        except (TypeError, ValueError):
+            spectra = None
+        if spectra is None or spectra.ndim != 2 or spectra.shape[1] != 36:
+            abort(422, "Each spectrum must be a list of 36 reflectances")
+        found = nearest_index.nearest_to_spectra(spectra, k)
+
+    matches = nearest_index.matches(*found)
+    return matches[0] if request.method == 'GET' else matches
+
+
+# As many colors as a full-sized page. Streamed colors don't pile up in
+# memory, so a stream can be much longer.
+MAX_LINE_STEPS = 10000
+MAX_STREAMED_STEPS = 1000000
+
+def line_steps(default=None):
+    """`steps` for a ladder or rainbow."""
+    steps = request.args.get("steps") or default
+    if steps is None:
+        abort(422, "You must specify `steps`")
+    steps = int(steps)
+    limit = MAX_STREAMED_STEPS if streaming() else MAX_LINE_STEPS
+    if not 2 <= steps <= limit:
+        abort(422, "Steps must be between 2 and {0}".format(limit))
+    return steps
+
 @app.route("/v1/munsell/ladder", methods=['GET'])
+@cached(names=['start_color', 'end_color'])
 def ladder():
     """An equally-spaced ladder of `steps` colors from `start_color` to
     `end_color`. The default is a ladder through Munsell-space; you
     can also specify the "mix" `method` to create a paint-mixing
     ladder.
 
+    Long ladders can be streamed as newline-delimited JSON, one color
+    per line, with `stream=1` (or by accepting application/x-ndjson).
+
     """
     if request.method == 'GET':
         a = color("start_color")
         b = color("end_color")
-        steps = int(request.args.get("steps"))
+        steps = line_steps()
         if not request.args.get("method") or request.args.get("method") == "munsell":
-            return [x.stats_dict() for x in numerical_ladder(a, b, steps)]
+            if streaming():
+                return ndjson(stats_spans(ladder_span, ("munsell", a, b, steps), steps))
+            return ladder_stats(a, b, steps)
         elif request.args.get("method") == "mix":
-            return [x.stats_dict() for x in mix_ladder(a, b, steps)]
+            if streaming():
+                return ndjson(stats_spans(ladder_span, ("mix", a, b, steps), steps))
+            return ladder_stats(a, b, steps, method="mix")
 
 
 @app.route("/v1/munsell/mix", methods=['GET'])
+@cached(names=['a_color', 'b_color'])
 def munsell_mix():
     """A paint-mixed in-between color, mixed from `a_color` and `b_color`
     in proportion based on `a_parts` and `b_parts`.
@@ -103,38 +315,124 @@ def munsell_mix():
         return Mix([a.p(a_prop), b.p(b_prop)]).stats_dict()
 
 
+@app.route("/v1/munsell/neutralize", methods=['GET'])
+@cached(names=['a_color', 'b_color'], unless=['a_pigment', 'b_pigment'])
+def neutralize():
+    """The proportions in which two colors mix to the most neutral gray
+    they can make, and the resulting mix.
+
+    Give either Munsell designations as `a_color` and `b_color`, or
+    pigment ids as `a_pigment` and `b_pigment` (or one of each). The
+    returned `a_parts` and `b_parts` add up to 1.
+
+    """
+    if request.method == 'GET':
+        a = color_or_pigment("a")
+        b = color_or_pigment("b")
+        a_prop = float(neutral_proportions(a.log_spectrum, b.log_spectrum)[0])
+        return {
+            'a_parts': a_prop,
+            'b_parts': 1 - a_prop,
+            'mix': Mix([a.p(a_prop), b.p(1 - a_prop)]).stats_dict(),
+        }
+
 @app.route("/v1/munsell/rainbow", methods=['GET'])
+@cached()
 def munsell_rainbow():
     """A rainbow is an even sampling of hues at a single value and chroma.
 
     Takes `value`, `chroma`, `steps` and an optional `offset`, which sets the starting hue.
+    Like ladders, rainbows can be streamed with `stream=1`.
 
     """
     if request.method == 'GET':
         value = float(request.args.get("value"))
         chroma = float(request.args.get("chroma"))
-        steps = int(request.args.get("steps") or 10)
+        steps = line_steps(10)
         offset = float(request.args.get("offset") or 0)
 
         if not value or not chroma:
             abort(422, "You must specify a value and a chroma")
-        return [x.stats_dict() for x in rainbow(value, chroma, steps, offset)]
+        if streaming():
+            return ndjson(stats_spans(rainbow_span, (value, chroma, steps, offset), steps))
+        return rainbow_stats(value, chroma, steps, offset)
+
 
+MAX_PAGE_STEPS = 100
+
+def page_steps():
+    value_steps = int(request.args.get("value_steps") or 10)
+    chroma_steps = int(request.args.get("chroma_steps") or 10)
+    if not 2 <= value_steps <= MAX_PAGE_STEPS or not 2 <= chroma_steps <= MAX_PAGE_STEPS:
+        abort(422, "Steps must be between 2 and {0}".format(MAX_PAGE_STEPS))
+    return value_steps, chroma_steps
 
 @app.route("/v1/munsell/page", methods=['GET'])
+@cached(hues=['hue'])
 def munsell_page():
     """A page is an even sampling of across value and chroma for a given `hue`.
-    Optionally takes `value_steps` and `chroma_steps`, each fo which default to 0.
+    Optionally takes `value_steps` and `chroma_steps`, each of which default to 10
+    (and go up to 100). With `stream=1`, each row of the page is a line of
+    newline-delimited JSON.
 
     """
     if request.method == 'GET':
         hue = request.args.get("hue")
-        chroma_steps = int(request.args.get("chroma_steps") or 10)
-        value_steps = int(request.args.get("value_steps") or 10)
-
         if not hue:
             abort(422, "You must specify a hue")
+        value_steps, chroma_steps = page_steps()
+        this_page = page_stats([hue], value_steps, chroma_steps)[0]
+        if streaming():
+            return ndjson([row] for row in this_page)
+        return this_page
+
+
+# Past this many swatches (about 11MB of JSON, or 40 pages of 25x40) an
+# atlas has to be streamed.
+MAX_ATLAS_SWATCHES = 40000
+
+@app.route("/v1/munsell/atlas", methods=['GET'])
+@cached()
+def munsell_atlas():
+    """The whole book: a page (see /v1/munsell/page) for each of the 40
+    hues, 2.5 apart, starting from 2.5R. Takes the same `value_steps`
+    and `chroma_steps`, up to 40,000 swatches in all; bigger atlases
+    (up to 100x100 pages) must be streamed with `stream=1`, a page per
+    line.
 
-        this_page = page(hue, value_steps, chroma_steps)
+    """
+    if request.method == 'GET':
+        value_steps, chroma_steps = page_steps()
+        if streaming():
+            return ndjson([{'hue': name_for_hue(hue),
+                            'page': page_stats([hue], value_steps, chroma_steps)[0]}]
+                          for hue in ATLAS_HUES.tolist())
+        if len(ATLAS_HUES) * value_steps * chroma_steps > MAX_ATLAS_SWATCHES:
+            abort(422, "Atlases of more than {0} swatches must be streamed, with `stream=1`"
+                  .format(MAX_ATLAS_SWATCHES))
+        pages = page_stats(ATLAS_HUES, value_steps, chroma_steps)
+        return [{'hue': name_for_hue(hue), 'page': this_page}
+                for hue, this_page in zip(ATLAS_HUES.tolist(), pages)]
+
+
+@app.route("/v1/munsell/gamut", methods=['GET'])
+@cached(hues=['hue'])
+def munsell_gamut():
+    """How far chroma goes: the highest chroma there is at each value,
+    every half step from 0 to 10, for a `hue` (or for each of the
+    atlas's 40 hues, without one). Give a `value` for just that value.
+    Colors asked for past the edge come back at it instead.
 
-        return [[x.stats_dict() for x in ladder] for ladder in this_page]
+    """
+    if request.method == 'GET':
+        hue = request.args.get("hue")
+        value = request.args.get("value")
+        try:
+            hues = [hue] if hue else ATLAS_HUES.tolist()
+            if value is None:
+                edges = gamut_stats(hues)
+            else:
+                edges = gamut_stats(hues, [float(value)])
+        except (KeyError, ValueError):
+            abort(422, "Hues look like \"5.0R\", and values are numbers")
+        return edges[0] if hue else edges
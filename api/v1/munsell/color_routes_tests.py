@@ -0,0 +1,53 @@
+import json
+import unittest
+
+from api import app
+import api.v1.munsell.color_routes as color_routes
+
+
+class TestLineSteps(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.ladder = {'start_color': '5R 4/12', 'end_color': '5PB 6/8'}
+
+    def test_long_ladders_stream(self):
+        steps = color_routes.MAX_LINE_STEPS + 500
+        response = self.client.get('/v1/munsell/ladder', query_string=dict(
+            self.ladder, steps=steps, stream=1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), steps)
+
+    def test_long_ladders_need_streaming(self):
+        response = self.client.get('/v1/munsell/ladder', query_string=dict(
+            self.ladder, steps=color_routes.MAX_LINE_STEPS + 500))
+        self.assertEqual(response.status_code, 422)
+
+    def test_too_few_steps(self):
+        for query in [dict(self.ladder, steps=1), dict(self.ladder, steps=1, stream=1)]:
+            response = self.client.get('/v1/munsell/ladder', query_string=query)
+            self.assertEqual(response.status_code, 422)
+        response = self.client.get('/v1/munsell/rainbow?value=5&chroma=8&steps=0&stream=1')
+        self.assertEqual(response.status_code, 422)
+
+
+class TestAtlas(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        # A little more than MAX_ATLAS_SWATCHES in all.
+        self.steps = {'value_steps': 40, 'chroma_steps': 30}
+
+    def test_big_atlases_stream(self):
+        response = self.client.get('/v1/munsell/atlas', query_string=dict(self.steps, stream=1))
+        self.assertEqual(response.status_code, 200)
+        pages = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(pages), len(color_routes.ATLAS_HUES))
+        self.assertEqual(pages[0]['hue'], "2.5R")
+        self.assertEqual((len(pages[0]['page']), len(pages[0]['page'][0])), (40, 30))
+
+    def test_big_atlases_need_streaming(self):
+        response = self.client.get('/v1/munsell/atlas', query_string=self.steps)
+        self.assertEqual(response.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ from api import app
 from flask import request
 from flask_api import FlaskAPI, status, exceptions
 from api.models import Pigment
+from api.pigment_store import pigment_store
+from api.routing import route_for
 
 
 @app.route("/v1/pigments", methods=['GET'])
@@ -10,7 +12,20 @@ def pigments():
     List pigments.
     """
     if request.method == 'GET':
-        return [p.short_dict() for p in Pigment.query.all()]
+        # Listed from the pigment catalog, and tagged with its digest, so
+        # clients (and caches) can ask again with If-None-Match and get a
+        # 304 -- without a query -- when nothing's changed.
+        catalog = pigment_store.catalog()
+        headers = {'ETag': '"{0}"'.format(catalog.tag), 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(catalog.tag):
+            return '', status.HTTP_304_NOT_MODIFIED, headers
+        return [{
+            'id': pigment_id,
+            'rgb': rgb,
+            'hex': hex,
+            'name': name,
+            'url': route_for('pigment', pigment_id=pigment_id)
+        } for pigment_id, name, rgb, hex in catalog.listing], status.HTTP_200_OK, headers
 
 
 @app.route("/v1/pigments/<int:pigment_id>", methods=['GET'])
@@ -19,4 +34,4 @@ def pigment(pigment_id):
     Get full specs on a pigment.
     """
     if request.method == 'GET':
-        return Pigment.query.get(pigment_id).full_dict()
+        return Pigment.query.get_or_404(pigment_id).full_dict()
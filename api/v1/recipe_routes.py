@@ -0,0 +1,78 @@
+from api import app
+from flask import request, abort
+from api.pigment_store import pigment_store
+
+from lib.color import Mix, lab, linear_rgb_for_hex
+from lib.munsell import color_from_name, MissingColorError
+import lib.recipes as recipes
+import numpy as np
+
+MAX_RECIPES = 20
+
+
+def target():
+    """The CIELAB color to match, from a munsell `color`, a `hex` code,
+    or a POSTed `spectrum`."""
+    data = request.data if request.method == 'POST' else request.args
+    if not isinstance(data, dict):
+        abort(422, "You must specify a `color`, `hex` or `spectrum`")
+    try:
+        if data.get("color"):
+            return recipes.target_lab(color_from_name(data["color"]).spectrum)
+        if data.get("hex"):
+            return lab(linear_rgb_for_hex([data["hex"]]))[0]
+        if data.get("spectrum") and request.method == 'POST':
+            spectrum = np.array(data["spectrum"], dtype=float)
+            if spectrum.shape != (36,):
+                abort(422, "A spectrum is a list of 36 reflectances")
+            return recipes.target_lab(spectrum)
+    except (ValueError, TypeError, MissingColorError) as e:
+        abort(422, str(e))
+    abort(422, "You must specify a `color`, `hex` or `spectrum`")
+
+
+def bounded(key, default, highest):
+    data = request.data if request.method == 'POST' else request.args
+    try:
+        value = int(data.get(key) or default)
+    except (TypeError, ValueError):
+        value = 0
+    if not 1 <= value <= highest:
+        abort(422, "`{0}` must be between 1 and {1}".format(key, highest))
+    return value
+
+
+@app.route("/v1/recipes", methods=['GET', 'POST'])
+def recipes_for():
+    """
+    Recipes for a color: the mixes of our pigments that come closest to it,
+    best first. Give a munsell `color` (like "5.0R 3/7") or a `hex` code,
+    or POST a `spectrum` of 36 reflectances from 380nm to 730nm.
+
+    Each recipe uses at most `pigments` pigments (default and most 3), and
+    you get `count` of them (default 5). Each comes with its `error`, in
+    delta E, and the mix it makes. For instance:
+
+    <code>{
+      "color": "5.0PB 4/8",
+      "pigments": 2
+    }</code>
+
+    """
+    lab_target = target()
+    max_pigments = bounded("pigments", recipes.MAX_PIGMENTS, recipes.MAX_PIGMENTS)
+    count = bounded("count", 5, MAX_RECIPES)
+
+    catalog = pigment_store.catalog()
+    if not len(catalog):
+        abort(404, "There are no pigments to mix")
+
+    found = []
+    for rows, proportions, error in recipes.solve(catalog.log_spectra, lab_target, max_pigments, count):
+        found.append({
+            'pigments': [{'id': int(catalog.ids[row]), 'name': catalog.names[row], 'proportion': proportion}
+                         for row, proportion in zip(rows, proportions)],
+            'error': error,
+            'mix': Mix([catalog.color(row, proportion) for row, proportion in zip(rows, proportions)]).stats_dict(),
+        })
+    return found
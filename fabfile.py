@@ -3,6 +3,7 @@ import os.path
 
 import tasks.db as db
 import tasks.migration as migration
+import tasks.munsell as munsell
 import tasks.test as test
 import tasks.server as server
 from tasks.requirements import requirements
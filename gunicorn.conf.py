@@ -0,0 +1,40 @@
+# Workers fork from a master that has already loaded the app and the
+# Munsell data, so the data is loaded once per box rather than once per
+# worker, and every worker shares it. The arrays themselves are mapped
+# read-only from lib/build, so they're shared pages however the
+# workers start.
+preload_app = True
+
+
+def on_starting(server):
+    # Metrics from the last run of the server don't count, and responses
+    # it cached may not be what this code would say.
+    from lib.metrics import clear_shared
+    from api.response_cache import shared
+    clear_shared()
+    shared.remove()
+
+
+def when_ready(server):
+    from lib.metrics import flush
+    from lib.munsell import preload
+    preload()
+    # The master's metrics (how long loading took) go in its own file...
+    flush(force=True)
+
+
+def post_fork(server, worker):
+    # ...so workers start from nothing rather than counting them again.
+    from lib.metrics import reset
+    reset()
+    # The compute pool (if there is one) forks from here, before the
+    # worker starts any threads.
+    from lib.offload import start
+    start()
+
+
+def worker_exit(server, worker):
+    from lib.metrics import flush
+    from lib.offload import shutdown
+    shutdown()
+    flush(force=True)
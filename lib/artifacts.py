@@ -0,0 +1,100 @@
+import hashlib
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+# Prebuilt binary forms of the data under lib/. An artifact is a
+# directory of .npy arrays plus a manifest recording the format
+# version and a checksum of the source files it was built from, so
+# it's rebuilt only when the sources (or the version) change. Arrays
+# open memory-mapped and read-only, so every worker on a box shares
+# the same pages.
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build')
+MANIFEST = 'manifest.json'
+
+
+def checksum(sources):
+    digest = hashlib.sha256()
+    for source in sources:
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def path_for(name, version):
+    return os.path.join(BUILD_DIR, "{0}-v{1}".format(name, version))
+
+
+def current_manifest(path, version, sources):
+    """The manifest of the artifact at `path`, or None if it's missing or
+    stale."""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != version or manifest.get('checksum') != checksum(sources):
+        return None
+    return manifest
+
+
+def load(name, version, sources):
+    """The arrays of an artifact, or None if it's missing, stale or
+    broken."""
+    path = path_for(name, version)
+    manifest = current_manifest(path, version, sources)
+    if manifest is None:
+        return None
+    try:
+        return {key: np.load(os.path.join(path, key + '.npy'), mmap_mode='r')
+                for key in manifest['arrays']}
+    except (KeyError, OSError, ValueError):
+        return None
+
+
+def save(name, version, sources, arrays):
+    """Write an artifact. The directory is built to one side and moved
+    into place, so a reader never sees half an artifact. If another
+    process gets the same artifact into place first, theirs is kept."""
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    path = path_for(name, version)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', dir=BUILD_DIR)
+    try:
+        os.chmod(tmp, 0o755)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp, key + '.npy'), np.asarray(array))
+        with open(os.path.join(tmp, MANIFEST), 'w') as f:
+            json.dump({
+                'version': version,
+                'checksum': checksum(sources),
+                'arrays': sorted(arrays),
+            }, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Something's there already.
+            if not os.path.isdir(path):
+                raise
+            if current_manifest(path, version, sources) is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+                return path
+            stale = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', dir=BUILD_DIR)
+            os.rename(path, os.path.join(stale, 'old'))
+            shutil.rmtree(stale, ignore_errors=True)
+            os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    remove_old_versions(name, version)
+    return path
+
+
+def remove_old_versions(name, version):
+    current = os.path.basename(path_for(name, version))
+    prefix = "{0}-v".format(name)
+    for entry in os.listdir(BUILD_DIR):
+        if entry.startswith(prefix) and entry != current and '.' not in entry:
+            shutil.rmtree(os.path.join(BUILD_DIR, entry), ignore_errors=True)
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lib.artifacts as artifacts
+
+
+class TestArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.build_dir = artifacts.BUILD_DIR
+        self.dir = tempfile.mkdtemp()
+        artifacts.BUILD_DIR = os.path.join(self.dir, 'build')
+        self.sources = [os.path.join(self.dir, 'source.csv')]
+        with open(self.sources[0], 'w') as f:
+            f.write("1,2,3\n")
+        self.arrays = {'numbers': np.arange(5)}
+
+    def tearDown(self):
+        artifacts.BUILD_DIR = self.build_dir
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        artifacts.save('test', 1, self.sources, self.arrays)
+        loaded = artifacts.load('test', 1, self.sources)
+        np.testing.assert_array_equal(loaded['numbers'], self.arrays['numbers'])
+
+    def test_stale(self):
+        artifacts.save('test', 1, self.sources, self.arrays)
+        with open(self.sources[0], 'w') as f:
+            f.write("4,5,6\n")
+        self.assertIsNone(artifacts.load('test', 1, self.sources))
+        # And saving again replaces it.
+        artifacts.save('test', 1, self.sources, {'numbers': np.arange(3)})
+        self.assertEqual(len(artifacts.load('test', 1, self.sources)['numbers']), 3)
+
+    def test_missing_array(self):
+        path = artifacts.save('test', 1, self.sources, self.arrays)
+        os.remove(os.path.join(path, 'numbers.npy'))
+        self.assertIsNone(artifacts.load('test', 1, self.sources))
+
+    def test_saved_already(self):
+        # As if another process got there first: theirs stays, and ours
+        # is cleaned up.
+        path = artifacts.save('test', 1, self.sources, self.arrays)
+        with open(os.path.join(path, artifacts.MANIFEST)) as f:
+            manifest = json.load(f)
+        self.assertEqual(artifacts.save('test', 1, self.sources, {'other': np.arange(2)}), path)
+        with open(os.path.join(path, artifacts.MANIFEST)) as f:
+            self.assertEqual(json.load(f), manifest)
+        self.assertEqual(os.listdir(artifacts.BUILD_DIR), [os.path.basename(path)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Microbenchmarks for the color engine's hot paths. Each case is timed
+# over enough calls to fill MIN_RUN_TIME, REPEATS times, and the best
+# run (the one with the least noise from the rest of the machine) is
+# the result. Cases marked cold clear the Munsell caches before every
+# call, so they measure the work rather than the cache.
+#
+#     python -m lib.bench run [out.json] [name-filter]
+#     python -m lib.bench compare before.json after.json [threshold]
+#
+# or `fab test.bench` and `fab test.bench_compare`.
+
+REPEATS = 5
+MIN_RUN_TIME = 0.2
+# How much slower (as a fraction) a case can get before compare calls
+# it a regression.
+THRESHOLD = 0.1
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Case():
+    def __init__(self, name, run, cold=False):
+        self.name = name
+        self.run = run
+        self.cold = cold
+
+
+def clear_caches():
+    import lib.munsell as munsell
+    munsell.spectrum_cache.clear()
+    munsell.page_cache.clear()
+
+
+def cases():
+    import lib.color as color
+    import lib.munsell as munsell
+    import lib.paints as paints
+
+    db = munsell.colors.get()
+    red = munsell.MunsellColor("5R", 4, 12)
+    blue = munsell.MunsellColor("5PB", 6, 8)
+    paint_list = [paints.cadmium_red, paints.yellow_ochre, paints.raw_umber, paints.alizarin,
+                  paints.gamboge, paints.burnt_sienna, paints.vermilion, paints.massicot,
+                  paints.red_ochre, paints.saffron]
+
+    def mix_spectrum(count):
+        colors = [paint.p(1) for paint in paint_list[:count]]
+        return lambda: color.Mix(colors).spectrum
+
+    found = [
+        Case('numerical_hue', lambda: munsell.numerical_hue("7.5YR")),
+        Case('color_from_name', lambda: munsell.color_from_name("7.5YR 6/8")),
+        Case('get_color_for.on_grid', lambda: db.get_color_for(25, 6, 8)),
+        Case('get_color_for.off_grid', lambda: db.get_color_for(27.3, 5.6, 7.3)),
+        Case('get_color_for.out_of_gamut', lambda: db.get_color_for(62.5, 2, 30)),
+        Case('Color.to_rgb', lambda: paints.cadmium_red.to_rgb()),
+    ]
+    found += [Case('Mix.spectrum.{0}'.format(count), mix_spectrum(count))
+              for count in (2, 3, 5, 10)]
+    # Pages are steps x steps, and can't be more than 100 on a side.
+    for steps in (10, 50, 100):
+        found.append(Case('page.{0}'.format(steps),
+                          lambda steps=steps: munsell.page_stats([25], steps, steps), cold=True))
+    # As the routes serve them.
+    for steps in (10, 100, 1000, 10000):
+        found += [
+            Case('rainbow.{0}'.format(steps),
+                 lambda steps=steps: munsell.rainbow_stats(6, 8, steps), cold=True),
+            Case('numerical_ladder.{0}'.format(steps),
+                 lambda steps=steps: munsell.ladder_stats(red, blue, steps), cold=True),
+            Case('mix_ladder.{0}'.format(steps),
+                 lambda steps=steps: munsell.ladder_stats(red, blue, steps, 'mix'), cold=True),
+        ]
+    return found
+
+
+def time_case(case):
+    """Seconds per call: the best of REPEATS runs, and their median."""
+    if case.cold:
+        def once():
+            clear_caches()
+            start = time.perf_counter()
+            case.run()
+            return time.perf_counter() - start
+    else:
+        def once():
+            start = time.perf_counter()
+            case.run()
+            return time.perf_counter() - start
+
+    once()
+    calls = 1
+    while True:
+        elapsed = sum(once() for _ in range(calls))
+        if elapsed >= MIN_RUN_TIME or calls >= 1 << 20:
+            break
+        calls *= 2 if elapsed == 0 else max(2, min(10, int(MIN_RUN_TIME / elapsed) + 1))
+    runs = [sum(once() for _ in range(calls)) / calls for _ in range(REPEATS)]
+    return {'best': min(runs), 'median': statistics.median(runs), 'calls': calls}
+
+
+# Imports and startup want a fresh interpreter every time.
+STARTUP_SCRIPTS = {
+    'import.lib.munsell': "import lib.munsell",
+    'import.lib.paints': "import lib.paints",
+    'startup.lib.munsell': "import lib.munsell; lib.munsell.preload()",
+}
+
+def time_startup(script):
+    code = ("import time; start = time.perf_counter(); {0}; "
+            "print(time.perf_counter() - start)").format(script)
+    runs = [float(subprocess.check_output([sys.executable, '-c', code], cwd=ROOT))
+            for _ in range(REPEATS)]
+    return {'best': min(runs), 'median': statistics.median(runs), 'calls': 1}
+
+
+def machine():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+
+def run(only=None, report=print):
+    """Time every case (whose name contains `only`, if given), as a dict
+    of results and the machine they ran on."""
+    results = {}
+    for name, script in sorted(STARTUP_SCRIPTS.items()):
+        if only is None or only in name:
+            results[name] = time_startup(script)
+            report(format_result(name, results[name]))
+    for case in cases():
+        if only is None or only in case.name:
+            results[case.name] = time_case(case)
+            report(format_result(case.name, results[case.name]))
+    return {'machine': machine(), 'results': results}
+
+
+def format_result(name, result):
+    return "{0:32} {1:>12} (median {2})".format(
+        name, format_seconds(result['best']), format_seconds(result['median']))
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return "{0:.3g}{1}".format(seconds / scale, unit)
+    return "{0:.3g}ns".format(seconds / 1e-9)
+
+
+def compare(before, after, threshold=THRESHOLD):
+    """(name, before, after, ratio) for every case both runs have, and
+    the names of those that got more than `threshold` slower."""
+    rows = []
+    regressions = []
+    for name in sorted(set(before['results']) & set(after['results'])):
+        old, new = before['results'][name]['best'], after['results'][name]['best']
+        ratio = new / old if old else float('inf')
+        rows.append((name, old, new, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv):
+    if argv[:1] == ['run']:
+        out = argv[1] if len(argv) > 1 else None
+        results = run(argv[2] if len(argv) > 2 else None)
+        if out:
+            with open(out, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            print("Wrote %s" % out)
+        return 0
+    if argv[:1] == ['compare'] and len(argv) in (3, 4):
+        with open(argv[1]) as f:
+            before = json.load(f)
+        with open(argv[2]) as f:
+            after = json.load(f)
+        threshold = float(argv[3]) if len(argv) > 3 else THRESHOLD
+        rows, regressions = compare(before, after, threshold)
+        for name, old, new, ratio in rows:
+            print("{0:32} {1:>10} -> {2:>10}  {3:6.2f}x{4}".format(
+                name, format_seconds(old), format_seconds(new), ratio,
+                "  REGRESSION" if name in regressions else ""))
+        if before['machine'].get('host') != after['machine'].get('host'):
+            print("(These ran on different machines.)")
+        if regressions:
+            print("%d regression(s) beyond %d%%" % (len(regressions), threshold * 100))
+            return 1
+        return 0
+    print("usage: python -m lib.bench run [out.json] [filter]\n"
+          "       python -m lib.bench compare before.json after.json [threshold]")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,37 @@
+import lib.bench as bench
+import unittest
+
+
+def results(**times):
+    return {'machine': {}, 'results': {name: {'best': best, 'median': best, 'calls': 1}
+                                       for name, best in times.items()}}
+
+
+class TestCompare(unittest.TestCase):
+    def test_flags_regressions_beyond_threshold(self):
+        rows, regressions = bench.compare(results(a=1.0, b=1.0, c=1.0), results(a=1.05, b=1.5, c=0.5), 0.1)
+        self.assertEqual(regressions, ['b'])
+        self.assertEqual([row[0] for row in rows], ['a', 'b', 'c'])
+        self.assertAlmostEqual(rows[1][3], 1.5)
+
+    def test_only_compares_shared_cases(self):
+        rows, regressions = bench.compare(results(a=1.0, old=1.0), results(a=1.0, new=9.0))
+        self.assertEqual([row[0] for row in rows], ['a'])
+        self.assertEqual(regressions, [])
+
+
+class TestFormat(unittest.TestCase):
+    def test_format_seconds(self):
+        self.assertEqual(bench.format_seconds(2.5), "2.5s")
+        self.assertEqual(bench.format_seconds(0.0123), "12.3ms")
+        self.assertEqual(bench.format_seconds(4.2e-6), "4.2us")
+        self.assertEqual(bench.format_seconds(5e-8), "50ns")
+
+
+class TestTiming(unittest.TestCase):
+    def test_time_case(self):
+        calls = []
+        result = bench.time_case(bench.Case('noop', lambda: calls.append(1)))
+        self.assertLessEqual(result['best'], result['median'])
+        self.assertGreater(result['calls'], 1)
+        self.assertGreater(len(calls), result['calls'] * bench.REPEATS)
@@ -1,33 +1,73 @@
 import numpy as np
 import math
-try:
-    import matplotlib.pyplot as plt
-    import matplotlib.patches as patches
-except:
-    pass
-
-from functools import reduce
+import os
 
+import lib.metrics as metrics
 import lib.observers as observers
 
+# Mixing happens in log space, where a weighted geometric mean is just
+# a weighted sum. Zero reflectance has no log, so it stands in as a
+# huge negative number: a zero with any weight at all still mixes to
+# zero (as it would raised to a power), and a zero with no weight
+# drops out.
+LOG_ZERO = -1e30
+
+# Spectra are kept, mixed and converted as float64, or with
+# SPECTRUM_PRECISION=float32, as float32: the source data's good for
+# three figures at best, and float32 halves the memory and doubles the
+# numbers per SIMD instruction. `fab munsell.precision` reports how far
+# colors drift when they're float32.
+SPECTRUM_DTYPE = np.dtype(os.environ.get('SPECTRUM_PRECISION', 'float64'))
+if SPECTRUM_DTYPE not in (np.float32, np.float64):
+    raise ValueError("SPECTRUM_PRECISION must be float32 or float64, not {0}".format(SPECTRUM_DTYPE))
+# The observers, in the same precision.
+RED, GREEN, BLUE = (curve.astype(SPECTRUM_DTYPE) for curve in (observers.red, observers.green, observers.blue))
+RGB_MATRIX = observers.rgb_matrix.astype(SPECTRUM_DTYPE)
+
+mix_evaluations = metrics.Counter(
+    'color_mix_evaluations_total', "Mixes worked out, one at a time or in batches.", ['kind'])
+rgb_conversions = metrics.Counter(
+    'color_rgb_conversions_total', "Spectra converted to rgb, one at a time or in batches.", ['kind'])
+
+def log_spectrum(spectrum):
+    with np.errstate(divide='ignore'):
+        return np.maximum(np.log(spectrum), LOG_ZERO)
+
 
 class Color():
-    def __init__(self, spectrum,  proportion=1, name="", frequencies=observers.frequencies):
-        self.spectrum = np.copy(spectrum)
+    # Subclasses that add attributes of their own get a __dict__ unless
+    # they declare __slots__ too.
+    __slots__ = ('spectrum', 'proportion', 'name', 'frequencies', 'imprecise', 'clipped', '_log_cache')
+
+    def __init__(self, spectrum,  proportion=1, name="", frequencies=observers.frequencies, log_spectrum=None):
+        self.spectrum = np.array(spectrum, dtype=SPECTRUM_DTYPE)
         # Not sure about storing proportion on the spectrum, but here we go
         self.proportion = proportion
         self.name = name
         self.frequencies = frequencies
         self.imprecise = False
         self.clipped = False
+        # If the caller already has the log spectrum, no need to redo it.
+        self._log_cache = None if log_spectrum is None else (self.spectrum, log_spectrum)
+
+    @property
+    def log_spectrum(self):
+        """The log of the spectrum, computed once per spectrum."""
+        spectrum = self.spectrum
+        cache = getattr(self, '_log_cache', None)
+        if cache is None or cache[0] is not spectrum:
+            cache = self._log_cache = (spectrum, log_spectrum(spectrum))
+        return cache[1]
 
     def color_part(self, x):
         return pow(max(min(x, 1), 0), 1/2.2)
 
     def to_rgb(self):
-        r = np.sum(np.multiply(self.spectrum, observers.red))
-        g = np.sum(np.multiply(self.spectrum, observers.green))
-        b = np.sum(np.multiply(self.spectrum, observers.blue))
+        if metrics.enabled:
+            rgb_conversions.inc(1, ('single',))
+        r = float(np.sum(np.multiply(self.spectrum, RED)))
+        g = float(np.sum(np.multiply(self.spectrum, GREEN)))
+        b = float(np.sum(np.multiply(self.spectrum, BLUE)))
         if (any([x > 1 or x < 0 for x in [r, g, b]])):
             self.imprecise = True
             self.clipped = True
@@ -40,7 +80,11 @@ class Color():
     def to_str(self):
         return "{0}: rgb({1}, {2}, {3})".format(self.name, *[int(x * 255) for x in self.to_rgb()])
 
+    # matplotlib is slow to import and only needed in notebooks, so it's
+    # imported when something is actually plotted.
     def swatch(self):
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as patches
         box = plt.figure(figsize=(2, 1)).add_subplot(111)
         box.add_patch(
             patches.Rectangle(
@@ -53,17 +97,25 @@ class Color():
         box.text(0.01, 0.01, self.to_str(), fontsize=12)
 
     def plot(self, color=None):
+        import matplotlib.pyplot as plt
         plt.plot(self.frequencies, self.spectrum, color=(color or self.to_rgb()))
 
     def p(self, num):
-        return Color(self.spectrum, num, self.name)
+        spectrum = self.spectrum
+        cache = getattr(self, '_log_cache', None)
+        log = cache[1] if cache is not None and cache[0] is spectrum else None
+        return Color(spectrum, num, self.name, log_spectrum=log)
 
     def stats_dict(self):
         rgb = self.to_rgb()
+        rgb255 = [int(x * 255) for x in rgb]
+        return self.rgb_stats(rgb, rgb255, "{0:02x}{1:02x}{2:02x}".format(*rgb255))
+
+    def rgb_stats(self, rgb, rgb255, hex):
         return {            "name": self.name,
             "rgb": rgb,
-            "rgb255": [int(x * 255) for x in rgb],
-            "hex": "#{0:02x}{1:02x}{2:02x}".format(*[int(x * 255) for x in rgb]),
+            "rgb255": rgb255,
+            "hex": "#" + hex,
             "imprecise": self.imprecise,
             "clipped": self.clipped,
         }
@@ -74,6 +126,10 @@ class Mix(Color):
         self.proportional_colors = proportional_colors
         self.name = self.make_name()
         self.proportion = 1
+        self.imprecise = False
+        self.clipped = False
+        self._log_spectrum = None
+        self._spectrum = None
 
     def additive(self):
         return np.sum([color.spectrum*color.proportion for color in self.proportional_colors])
@@ -81,14 +137,30 @@ class Mix(Color):
     def total_portion(self):
         return float(sum([color.proportion for color in self.proportional_colors]))
 
-    @property
-    def spectrum(self):
-        if len(self.proportional_colors) == 1:
-            return self.proportional_colors[0]
+    def weights(self):
         total_portion = self.total_portion()
+        return np.array([color.proportion / total_portion for color in self.proportional_colors],
+                        dtype=SPECTRUM_DTYPE)
 
-        power_colors = [np.power(color.spectrum, color.proportion/total_portion) for color in self.proportional_colors]
-        return reduce(np.multiply, power_colors)
+    # The mix is the weighted geometric mean of its colors, worked out
+    # once, in log space, the first time it's asked for.
+    @property
+    def log_spectrum(self):
+        if self._log_spectrum is None:
+            if metrics.enabled:
+                mix_evaluations.inc(1, ('single',))
+            logs = np.array([color.log_spectrum for color in self.proportional_colors])
+            self._log_spectrum = self.weights().dot(logs)
+        return self._log_spectrum
+
+    @property
+    def spectrum(self):
+        if self._spectrum is None:
+            if len(self.proportional_colors) == 1:
+                self._spectrum = np.copy(self.proportional_colors[0].spectrum)
+            else:
+                self._spectrum = np.exp(self.log_spectrum)
+        return self._spectrum
 
     def make_name(self):
         total_portion = sum([color.proportion for color in self.proportional_colors])
@@ -96,9 +168,198 @@ class Mix(Color):
 
 
 
+def mix_spectra(log_spectra, proportions):
+    """Many mixes at once: the spectra of M mixes of K colors, given the
+    colors' (K, 36) log spectra and an (M, K) array of proportions."""
+    log_spectra = np.asarray(log_spectra)
+    proportions = np.asarray(proportions, dtype=log_spectra.dtype)
+    if metrics.enabled:
+        mix_evaluations.inc(len(proportions), ('batch',))
+    weights = proportions / proportions.sum(axis=1, keepdims=True)
+    return np.exp(weights.dot(log_spectra))
+
+
+def mix_stats(colors, proportions):
+    """The stats_dict of a Mix of `colors` in each row of `proportions`,
+    mixed and converted together rather than a Mix at a time."""
+    logs = np.array([color.log_spectrum for color in colors])
+    # Names can change as colors resolve, so they're read after.
+    names = [color.name for color in colors]
+    proportions = np.asarray(proportions, dtype=float)
+    shares = (100 * proportions / proportions.sum(axis=1, keepdims=True)).tolist()
+    clipped, rgb, rgb255 = SpectrumBatch(mix_spectra(logs, proportions)).rgb_arrays()
+    return [{
+        "name": " + ".join("{0:.1f}% {1}".format(share, name) for share, name in zip(row, names)),
+        "rgb": mix_rgb,
+        "rgb255": mix_rgb255,
+        "hex": "#" + mix_hex,
+        "imprecise": mix_clipped,
+        "clipped": mix_clipped,
+    } for row, mix_clipped, mix_rgb, mix_rgb255, mix_hex in zip(
+        shares, clipped.tolist(), rgb.tolist(), rgb255.tolist(), hex_codes(rgb255))]
+
+
+# Searching for the proportions at which pairs of colors mix to the
+# most neutral gray -- the mix whose rgb channels are closest together.
+# Clipping can leave more than one dip in the spread, so a coarse scan
+# finds the right neighborhood before golden-section search narrows it
+# down. `tolerance` is on the proportion of the first color.
+GOLDEN = (math.sqrt(5) - 1) / 2
+NEUTRAL_SCAN_STEPS = 20
+
+def rgb_spread(log_a, log_b, weights):
+    spectra = np.exp(weights[:, None] * log_a + (1 - weights[:, None]) * log_b)
+    rgb = SpectrumBatch(spectra).to_rgb()
+    return rgb.max(axis=1) - rgb.min(axis=1)
+
+def neutral_proportions(log_a, log_b, tolerance=1e-4):
+    """For each pair of rows of the (N, 36) log spectra `log_a` and
+    `log_b`, the proportion of a (from 0 to 1) at which the pair mixes
+    to the most neutral gray."""
+    log_a, log_b = np.atleast_2d(log_a), np.atleast_2d(log_b)
+    steps = np.linspace(0, 1, NEUTRAL_SCAN_STEPS + 1)
+    spreads = rgb_spread(
+        np.repeat(log_a, len(steps), axis=0),
+        np.repeat(log_b, len(steps), axis=0),
+        np.tile(steps, len(log_a)))
+    best = spreads.reshape(len(log_a), len(steps)).argmin(axis=1)
+    low = steps[np.maximum(best - 1, 0)]
+    high = steps[np.minimum(best + 1, NEUTRAL_SCAN_STEPS)]
+    c = high - GOLDEN * (high - low)
+    d = low + GOLDEN * (high - low)
+    fc = rgb_spread(log_a, log_b, c)
+    fd = rgb_spread(log_a, log_b, d)
+    while (high - low).max() > tolerance:
+        # Keep whichever end of the bracket holds the grayer point; only
+        # one new point per pair needs evaluating each round.
+        left = fc < fd
+        high = np.where(left, d, high)
+        low = np.where(left, low, c)
+        c, d = np.where(left, high - GOLDEN * (high - low), d), np.where(left, c, low + GOLDEN * (high - low))
+        new = np.where(left, c, d)
+        fnew = rgb_spread(log_a, log_b, new)
+        fc, fd = np.where(left, fnew, fd), np.where(left, fc, fnew)
+    return (low + high) / 2
+
+
+class SpectrumBatch():
+    """Many spectra at once, as rows of an (N, 36) array. Conversions
+    work on the whole batch with array operations, rather than color by
+    color."""
+    def __init__(self, spectra):
+        self.spectra = np.asarray(spectra, dtype=SPECTRUM_DTYPE)
+
+    @classmethod
+    def of(cls, colors):
+        return cls([color.spectrum for color in colors])
+
+    def __len__(self):
+        return len(self.spectra)
+
+    def to_linear_rgb(self):
+        return self.spectra.dot(RGB_MATRIX)
+
+    def clipped(self):
+        """Which colors fall outside the rgb gamut."""
+        linear = self.to_linear_rgb()
+        return ((linear > 1) | (linear < 0)).any(axis=1)
+
+    def to_rgb(self):
+        if metrics.enabled:
+            rgb_conversions.inc(len(self.spectra), ('batch',))
+        return np.power(self.to_linear_rgb().clip(0, 1), 1/2.2)
+
+    def to_rgb255(self):
+        return (self.to_rgb() * 255).astype(int)
+
+    def to_hex(self):
+        return hex_codes(self.to_rgb255())
+
+    def to_lab(self):
+        return lab(self.to_linear_rgb())
+
+    def rgb_arrays(self):
+        """Which colors are clipped, their rgb, and their rgb255, from a
+        single conversion."""
+        if metrics.enabled:
+            rgb_conversions.inc(len(self.spectra), ('batch',))
+        linear = self.to_linear_rgb()
+        clipped = ((linear > 1) | (linear < 0)).any(axis=1)
+        rgb = np.power(linear.clip(0, 1), 1/2.2)
+        return clipped, rgb, (rgb * 255).astype(int)
+
+    def stats_dicts(self, colors):
+        """The stats_dict of each of `colors`, whose spectra make up this
+        batch."""
+        clipped, rgb, rgb255 = self.rgb_arrays()
+        dicts = []
+        for color, color_clipped, color_rgb, color_rgb255, color_hex in zip(
+                colors, clipped, rgb.tolist(), rgb255.tolist(), hex_codes(rgb255)):
+            if color_clipped:
+                color.imprecise = True
+                color.clipped = True
+            dicts.append(color.rgb_stats(color_rgb, color_rgb255, color_hex))
+        return dicts
+
+
+def hex_codes(rgb255):
+    packed = (rgb255[:, 0] << 16) | (rgb255[:, 1] << 8) | rgb255[:, 2]
+    return ["{0:06x}".format(x) for x in packed.tolist()]
+
+
+def linear_rgb_for_hex(codes):
+    """Linear rgb for hex codes like "#7a3135", undoing to_rgb's gamma."""
+    try:
+        packed = np.array([int(code.lstrip('#'), 16) if len(code.lstrip('#')) == 6 else -1
+                           for code in codes])
+    except (AttributeError, TypeError, ValueError):
+        packed = np.array([-1])
+    if (packed < 0).any():
+        raise ValueError("Hex codes look like #7a3135")
+    rgb255 = np.stack([packed >> 16, (packed >> 8) & 255, packed & 255], axis=1)
+    return np.power(rgb255 / 255.0, 2.2)
+
+
+# Perceptual coordinates: linear rgb goes to CIE XYZ (under D65) and on
+# to CIELAB, where distances roughly track how different colors look.
+RGB_TO_XYZ = np.array([
+    [0.4124, 0.3576, 0.1805],
+    [0.2126, 0.7152, 0.0722],
+    [0.0193, 0.1192, 0.9505],
+])
+D65 = np.array([0.95047, 1.0, 1.08883])
+LAB_EPSILON = (6 / 29.0) ** 3
+
+def lab(linear_rgb):
+    """CIELAB for rows of linear rgb. Out-of-gamut colors aren't clipped
+    first, so they stay apart."""
+    xyz = np.asarray(linear_rgb, dtype=float).dot(RGB_TO_XYZ.T) / D65
+    f = np.where(xyz > LAB_EPSILON, np.cbrt(xyz), xyz / (3 * (6 / 29.0) ** 2) + 4 / 29.0)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def stats_dicts(colors):
+    """stats_dict for each of `colors`, converted to rgb in one batch."""
+    colors = list(colors)
+    if not colors:
+        return []
+    return SpectrumBatch.of(colors).stats_dicts(colors)
+
+
+def resample(xs, ys, desired_xs):
+    """Linearly interpolate `ys`, sampled at (increasing) `xs` along their
+    last axis, to `desired_xs`. Any number of rows at once."""
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    desired_xs = np.asarray(desired_xs, dtype=float)
+    after = np.clip(np.searchsorted(xs, desired_xs), 1, len(xs) - 1)
+    before = after - 1
+    weights = np.clip((desired_xs - xs[before]) / (xs[after] - xs[before]), 0, 1)
+    return ys[..., before] * (1 - weights) + ys[..., after] * weights
+
 def interpolate(xs, ys, desired_x):
-    before = np.where(xs < desired_x)[0][-1]
-    after = np.where(xs > desired_x)[0][0]
-    # cheating, but doing prop'ly probably unnecessary given how small
-    # the steps are in the original data.
-    return (ys[before] + ys[after]) / 2
+    return float(resample(xs, ys, [desired_x])[0])
@@ -0,0 +1,104 @@
+import lib.color as color
+import lib.paints as paints
+import numpy as np
+import unittest
+
+
+class TestSpectrumBatch(unittest.TestCase):
+    def setUp(self):
+        self.colors = [paints.cadmium_red, paints.ultramarine, paints.titanium_white]
+        self.batch = color.SpectrumBatch.of(self.colors)
+
+    def test_to_rgb(self):
+        rgb = self.batch.to_rgb()
+        for row, c in zip(rgb, self.colors):
+            np.testing.assert_allclose(row, c.to_rgb(), rtol=1e-12)
+
+    def test_to_hex(self):
+        self.assertListEqual(self.batch.to_hex(), [c.to_hex() for c in self.colors])
+
+    def test_stats_dicts(self):
+        dicts = color.stats_dicts(self.colors)
+        for d, c in zip(dicts, self.colors):
+            expected = c.stats_dict()
+            self.assertEqual(d["hex"], expected["hex"])
+            self.assertEqual(d["rgb255"], expected["rgb255"])
+            self.assertEqual(d["clipped"], expected["clipped"])
+            self.assertEqual(d["name"], expected["name"])
+
+    def test_stats_dicts_of_nothing(self):
+        self.assertEqual(color.stats_dicts([]), [])
+
+
+class TestLab(unittest.TestCase):
+    def test_white_and_black(self):
+        np.testing.assert_allclose(color.lab([[1, 1, 1], [0, 0, 0]]), [[100, 0, 0], [0, 0, 0]], atol=0.02)
+
+    def test_hex_round_trip(self):
+        hexes = color.SpectrumBatch.of([paints.cadmium_red, paints.ultramarine]).to_hex()
+        rgb = color.linear_rgb_for_hex(["#" + code for code in hexes])
+        self.assertListEqual(color.hex_codes((np.power(rgb, 1/2.2) * 255 + 0.5).astype(int)), hexes)
+
+    def test_bad_hex(self):
+        with self.assertRaises(ValueError):
+            color.linear_rgb_for_hex(["#12345"])
+
+
+class TestMix(unittest.TestCase):
+    def test_geometric_mean(self):
+        mix = color.Mix([paints.cadmium_red.p(1), paints.ultramarine.p(3)])
+        expected = np.power(paints.cadmium_red.spectrum, 0.25) * np.power(paints.ultramarine.spectrum, 0.75)
+        np.testing.assert_allclose(mix.spectrum, expected, rtol=1e-12)
+
+    def test_zero_reflectance(self):
+        black = color.Color(np.zeros(36))
+        mix = color.Mix([black.p(0.001), paints.titanium_white.p(1)])
+        self.assertTrue((mix.spectrum == 0).all())
+        mix = color.Mix([black.p(0), paints.titanium_white.p(1)])
+        np.testing.assert_allclose(mix.spectrum, paints.titanium_white.spectrum, rtol=1e-12)
+
+    def test_single_color(self):
+        mix = color.Mix([paints.cadmium_red])
+        np.testing.assert_array_equal(mix.spectrum, paints.cadmium_red.spectrum)
+
+    def test_mix_spectra(self):
+        ingredients = [paints.cadmium_red, paints.ultramarine, paints.titanium_white]
+        proportions = np.array([[1, 1, 0], [2, 1, 1]])
+        spectra = color.mix_spectra([c.log_spectrum for c in ingredients], proportions)
+        for spectrum, row in zip(spectra, proportions):
+            expected = color.Mix([c.p(x) for c, x in zip(ingredients, row)]).spectrum
+            np.testing.assert_allclose(spectrum, expected, rtol=1e-12)
+
+
+class TestNeutralProportions(unittest.TestCase):
+    def test_finds_grayest_mix(self):
+        a, b = paints.cadmium_red, paints.phthalo_green
+        proportion = color.neutral_proportions(a.log_spectrum, b.log_spectrum)[0]
+        weights = np.linspace(0, 1, 1001)
+        spreads = color.rgb_spread(a.log_spectrum[None, :], b.log_spectrum[None, :], weights)
+        self.assertAlmostEqual(proportion, weights[spreads.argmin()], delta=2e-3)
+
+    def test_many_pairs(self):
+        logs_a = np.array([paints.cadmium_red.log_spectrum, paints.ultramarine.log_spectrum])
+        logs_b = np.array([paints.phthalo_green.log_spectrum, paints.cadmium_yellow.log_spectrum])
+        proportions = color.neutral_proportions(logs_a, logs_b, tolerance=1e-6)
+        self.assertEqual(proportions.shape, (2,))
+        for proportion, a, b in zip(proportions, logs_a, logs_b):
+            self.assertAlmostEqual(proportion, color.neutral_proportions(a, b, tolerance=1e-6)[0], places=5)
+
+
+class TestResample(unittest.TestCase):
+    def test_matches_interp(self):
+        xs = np.array([0.0, 1.0, 2.5, 4.0])
+        ys = np.array([[0.0, 2.0, 5.0, 1.0], [1.0, 1.0, 3.0, 3.0]])
+        desired = [-1, 0, 0.5, 2.5, 3.0, 4.0, 9]
+        resampled = color.resample(xs, ys, desired)
+        for row, y in zip(resampled, ys):
+            np.testing.assert_allclose(row, np.interp(desired, xs, y))
+
+    def test_paints_from_csv(self):
+        loaded, frequencies = paints.load_paints()
+        np.testing.assert_array_equal(frequencies, paints.frequencies)
+        self.assertListEqual(list(loaded), list(paints.paints))
+        for name, spectrum in loaded.items():
+            np.testing.assert_allclose(spectrum, paints.paints[name], rtol=1e-12)
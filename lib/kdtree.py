@@ -0,0 +1,109 @@
+import heapq
+import numpy as np
+
+# A k-d tree for nearest-neighbor lookups among a few tens of thousands
+# of points in a handful of dimensions. The nodes live in flat arrays
+# and the points are reordered so every leaf is one contiguous slice;
+# a query walks the tree in Python and measures whole leaves at a time
+# with numpy.
+
+LEAF_SIZE = 16
+
+
+class KDTree():
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        points = np.asarray(points, dtype=float)
+        self.order = np.arange(len(points))
+        dims, splits, lefts, rights, starts, ends = [], [], [], [], [], []
+
+        def node(start, end):
+            dims.append(-1)
+            splits.append(0.0)
+            lefts.append(-1)
+            rights.append(-1)
+            starts.append(start)
+            ends.append(end)
+            return len(dims) - 1
+
+        pending = [node(0, len(points))]
+        while pending:
+            n = pending.pop()
+            start, end = starts[n], ends[n]
+            if end - start <= leaf_size:
+                continue
+            # Split the widest dimension at its median.
+            members = points[self.order[start:end]]
+            dim = int(np.argmax(members.max(axis=0) - members.min(axis=0)))
+            middle = (end - start) // 2
+            order = np.argpartition(members[:, dim], middle)
+            self.order[start:end] = self.order[start:end][order]
+            dims[n] = dim
+            splits[n] = float(points[self.order[start + middle], dim])
+            lefts[n] = node(start, start + middle)
+            rights[n] = node(start + middle, end)
+            pending.extend([lefts[n], rights[n]])
+
+        self.points = points[self.order]
+        self.dims, self.splits = dims, splits
+        self.lefts, self.rights = lefts, rights
+        self.starts, self.ends = starts, ends
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """A tree over already-built arrays (see to_arrays). The points
+        stay wherever they are, memory-mapped say; only the nodes are
+        unpacked, into lists, which are quicker to walk."""
+        tree = cls.__new__(cls)
+        tree.points = arrays['points']
+        tree.order = arrays['order']
+        tree.splits = arrays['splits'].tolist()
+        tree.dims, tree.lefts, tree.rights, tree.starts, tree.ends = arrays['nodes'].tolist()
+        return tree
+
+    def to_arrays(self):
+        return {
+            'points': self.points,
+            'order': self.order,
+            'splits': np.array(self.splits, dtype=float),
+            'nodes': np.array([self.dims, self.lefts, self.rights, self.starts, self.ends], dtype=np.int64),
+        }
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, points, k=1):
+        """Distances to, and indices (into the points the tree was built
+        from) of, the `k` nearest neighbors of each of `points`, nearest
+        first."""
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        k = min(k, len(self))
+        distances = np.empty((len(points), k))
+        indices = np.empty((len(points), k), dtype=int)
+        for i, point in enumerate(points):
+            distances[i], indices[i] = self.query_one(point, k)
+        return distances, indices
+
+    def query_one(self, point, k):
+        best = np.full(k, np.inf)
+        best_positions = np.zeros(k, dtype=int)
+        coordinates = point.tolist()
+        # (lower bound on squared distance, node), nearest-looking first
+        pending = [(0.0, 0)]
+        while pending:
+            bound, n = heapq.heappop(pending)
+            if bound >= best[-1]:
+                break
+            dim = self.dims[n]
+            if dim < 0:
+                start, end = self.starts[n], self.ends[n]
+                squared = ((self.points[start:end] - point) ** 2).sum(axis=1)
+                candidates = np.concatenate([best, squared])
+                positions = np.concatenate([best_positions, np.arange(start, end)])
+                keep = np.argsort(candidates, kind='stable')[:k]
+                best, best_positions = candidates[keep], positions[keep]
+                continue
+            offset = coordinates[dim] - self.splits[n]
+            near, far = (self.lefts[n], self.rights[n]) if offset < 0 else (self.rights[n], self.lefts[n])
+            heapq.heappush(pending, (bound, near))
+            heapq.heappush(pending, (max(bound, offset * offset), far))
+        return np.sqrt(best), self.order[best_positions]
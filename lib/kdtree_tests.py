@@ -0,0 +1,34 @@
+import lib.kdtree as kdtree
+import numpy as np
+import unittest
+
+
+class TestKDTree(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.points = rng.normal(size=(2000, 3))
+        self.points[:100] = self.points[100:200]
+        self.queries = rng.normal(size=(50, 3))
+        self.tree = kdtree.KDTree(self.points)
+
+    def test_matches_brute_force(self):
+        distances, indices = self.tree.query(self.queries, k=4)
+        everything = np.sqrt(((self.queries[:, None] - self.points[None]) ** 2).sum(axis=2))
+        expected = np.sort(everything, axis=1)[:, :4]
+        np.testing.assert_allclose(distances, expected)
+        rows = np.arange(len(self.queries))[:, None]
+        np.testing.assert_allclose(everything[rows, indices], expected)
+
+    def test_exact_match(self):
+        distances, indices = self.tree.query(self.points[500], k=1)
+        self.assertEqual(distances[0, 0], 0)
+        self.assertEqual(indices[0, 0], 500)
+
+    def test_k_larger_than_tree(self):
+        distances, indices = kdtree.KDTree(self.points[:3]).query(self.queries[:2], k=10)
+        self.assertEqual(indices.shape, (2, 3))
+
+    def test_round_trip(self):
+        tree = kdtree.KDTree.from_arrays(self.tree.to_arrays())
+        for a, b in zip(tree.query(self.queries, k=3), self.tree.query(self.queries, k=3)):
+            np.testing.assert_array_equal(a, b)
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache():
+    """A size-bounded, thread-safe least-recently-used cache, counting its
+    hits, misses and evictions. `maxsize` is a number of entries, or with
+    `sizeof` (a function of a value, say its length in bytes), the most
+    the entries' sizes can add up to."""
+    def __init__(self, maxsize, sizeof=None):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.sizeof else 1
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self.total -= self._sizes.pop(key)
+            # Something bigger than the whole cache would only push
+            # everything else out, then itself.
+            if size > self.maxsize:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.total += size
+            self._evict()
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.total = 0
+
+    def _evict(self):
+        while self.total > self.maxsize:
+            key, _ = self._data.popitem(last=False)
+            self.total -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'total': self.total,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,46 @@
+import lib.lru as lru
+import unittest
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = lru.LRUCache(2)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = lru.LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_resize(self):
+        cache = lru.LRUCache(3)
+        for key in "abc":
+            cache.put(key, key)
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get("c"), "c")
+
+    def test_sizeof(self):
+        cache = lru.LRUCache(10, sizeof=len)
+        cache.put("a", "xxxx")
+        cache.put("b", "xxxx")
+        cache.put("c", "xxxx")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((len(cache), cache.total), (2, 8))
+        cache.put("b", "x")
+        self.assertEqual(cache.total, 5)
+
+    def test_too_big(self):
+        cache = lru.LRUCache(10, sizeof=len)
+        cache.put("a", "xxxx")
+        cache.put("b", "x" * 11)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "xxxx")
@@ -0,0 +1,244 @@
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+# Counters and histograms for the hot paths, in the Prometheus text
+# format. Metrics are declared once, at import, and each process keeps
+# its own values in memory. To add up every worker's, each process
+# writes its values to a file of its own in SHARED_DIR now and then
+# (see flush), and whoever is asked for the metrics reads them all.
+# Files outlive their workers, so counts don't go backwards when a
+# worker is recycled; the server clears the directory when it starts.
+#
+# With METRICS=0 in the environment, `enabled` is False and every
+# recording call returns straight away. Hot code checks `enabled`
+# itself before doing any work to record something.
+
+enabled = os.environ.get('METRICS', '1').lower() not in ('0', 'false', 'off', 'no')
+SHARED_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'palette-metrics'))
+FLUSH_INTERVAL = 1.0
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+registry = {}
+
+
+class Metric():
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+        registry[name] = self
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(labels), value if self.kind == 'counter' else list(value)]
+                      for labels, value in self.values.items()]
+        return {'kind': self.kind, 'help': self.help, 'labels': list(self.label_names),
+                'values': values}
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        if not enabled:
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=(), count=1):
+        """Count `value` in its bucket (`count` times, for a batch of the
+        same). Values are kept as one count per bucket (not cumulative),
+        then the sum, then the total count."""
+        if not enabled:
+            return
+        with self._lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 3)
+            counts[bisect.bisect_left(self.buckets, value)] += count
+            counts[-2] += value * count
+            counts[-1] += count
+
+    def time(self, labels=()):
+        return Timer(self, labels)
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot['buckets'] = list(self.buckets)
+        return snapshot
+
+
+class Timer():
+    """Observes how long its `with` block takes, in seconds."""
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Tally(threading.local):
+    """A running count for whatever the current thread is doing (a
+    request, say), to observe into a histogram when it's done."""
+    count = 0
+
+    def add(self, amount=1):
+        self.count += amount
+
+    def take(self):
+        count, self.count = self.count, 0
+        return count
+
+
+###
+# Sharing between processes.
+
+def snapshot():
+    return {name: metric.snapshot() for name, metric in registry.items()}
+
+def merge(snapshots):
+    """Add up snapshots (from several processes) into one."""
+    merged = {}
+    for snap in snapshots:
+        for name, metric in snap.items():
+            into = merged.setdefault(name, dict(metric, values={}))
+            for labels, value in metric['values']:
+                key = tuple(labels)
+                if key not in into['values']:
+                    into['values'][key] = value
+                elif metric['kind'] == 'counter':
+                    into['values'][key] += value
+                else:
+                    into['values'][key] = [a + b for a, b in zip(into['values'][key], value)]
+    for metric in merged.values():
+        metric['values'] = [[list(labels), value] for labels, value in metric['values'].items()]
+    return merged
+
+
+def own_file():
+    return os.path.join(SHARED_DIR, "metrics-{0}.json".format(os.getpid()))
+
+_last_flush = 0.0
+
+def flush(force=False):
+    """Write this process's values to its file, at most once every
+    FLUSH_INTERVAL seconds unless `force`d. Trouble writing means the
+    other processes see older numbers, nothing worse."""
+    global _last_flush
+    now = time.monotonic()
+    if not enabled or (not force and now - _last_flush < FLUSH_INTERVAL):
+        return
+    _last_flush = now
+    try:
+        os.makedirs(SHARED_DIR, exist_ok=True)
+        path = own_file()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def collect():
+    """Every process's values, added up."""
+    flush(force=True)
+    snapshots = []
+    try:
+        names = [name for name in os.listdir(SHARED_DIR) if name.endswith('.json')]
+    except OSError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(SHARED_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    if not any(name == os.path.basename(own_file()) for name in names):
+        snapshots.append(snapshot())
+    return merge(snapshots)
+
+def reset():
+    """Forget this process's values; for a worker forked from a master
+    that has some of its own."""
+    for metric in registry.values():
+        metric.reset()
+
+def clear_shared():
+    """Forget every process's values; for when the server starts."""
+    try:
+        for name in os.listdir(SHARED_DIR):
+            if name.startswith('metrics-'):
+                os.remove(os.path.join(SHARED_DIR, name))
+    except OSError:
+        pass
+
+
+###
+# The text format.
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(
+        name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs) + '}'
+
+def format_number(x):
+    if isinstance(x, float):
+        if math.isinf(x):
+            return '+Inf' if x > 0 else '-Inf'
+        return repr(x)
+    return str(x)
+
+def render(metrics):
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append("# HELP {0} {1}".format(name, metric['help']))
+        lines.append("# TYPE {0} {1}".format(name, metric['kind']))
+        for labels, value in sorted(metric['values']):
+            if metric['kind'] == 'counter':
+                lines.append("{0}{1} {2}".format(
+                    name, format_labels(metric['labels'], labels), format_number(value)))
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], value):
+                cumulative += count
+                lines.append("{0}_bucket{1} {2}".format(
+                    name, format_labels(metric['labels'], labels, [('le', format_number(float(bound)))]),
+                    cumulative))
+            lines.append("{0}_sum{1} {2}".format(
+                name, format_labels(metric['labels'], labels), format_number(value[-2])))
+            lines.append("{0}_count{1} {2}".format(
+                name, format_labels(metric['labels'], labels), value[-1]))
+    return "\n".join(lines) + "\n"
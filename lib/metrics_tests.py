@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import lib.metrics as metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.enabled = metrics.enabled
+        metrics.enabled = True
+        self.counter = metrics.Counter('test_things_total', "Things.", ['kind'])
+        self.histogram = metrics.Histogram('test_seconds', "Seconds.", buckets=(1, 2))
+
+    def tearDown(self):
+        metrics.enabled = self.enabled
+        metrics.registry.pop('test_things_total')
+        metrics.registry.pop('test_seconds')
+
+    def test_counter(self):
+        self.counter.inc(1, ('a',))
+        self.counter.inc(2, ('a',))
+        self.counter.inc(1, ('b',))
+        self.assertEqual(self.counter.values, {('a',): 3, ('b',): 1})
+
+    def test_histogram(self):
+        for value in (0.5, 1, 1.5, 3):
+            self.histogram.observe(value)
+        self.assertEqual(self.histogram.values[()], [2, 1, 1, 6, 4])
+        self.histogram.observe(2, count=3)
+        self.assertEqual(self.histogram.values[()], [2, 4, 1, 12, 7])
+
+    def test_disabled(self):
+        metrics.enabled = False
+        self.counter.inc(1, ('a',))
+        self.histogram.observe(1)
+        self.assertEqual(self.counter.values, {})
+        self.assertEqual(self.histogram.values, {})
+
+    def test_tally(self):
+        tally = metrics.Tally()
+        tally.add()
+        tally.add(2)
+        self.assertEqual(tally.take(), 3)
+        self.assertEqual(tally.take(), 0)
+
+    def test_merge(self):
+        self.counter.inc(1, ('a',))
+        self.histogram.observe(1.5)
+        merged = metrics.merge([metrics.snapshot(), json.loads(json.dumps(metrics.snapshot()))])
+        self.assertEqual(merged['test_things_total']['values'], [[['a'], 2]])
+        self.assertEqual(merged['test_seconds']['values'], [[[], [0, 2, 0, 3.0, 2]]])
+
+    def test_render(self):
+        self.counter.inc(1, ('a"b',))
+        self.histogram.observe(1.5)
+        self.histogram.observe(5)
+        text = metrics.render(metrics.snapshot())
+        self.assertIn('# TYPE test_things_total counter\ntest_things_total{kind="a\\"b"} 1\n', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 0\n'
+                      'test_seconds_bucket{le="2.0"} 1\n'
+                      'test_seconds_bucket{le="+Inf"} 2\n'
+                      'test_seconds_sum 6.5\n'
+                      'test_seconds_count 2\n', text)
+
+    def test_collect_adds_up_processes(self):
+        shared_dir = metrics.SHARED_DIR
+        metrics.SHARED_DIR = tempfile.mkdtemp()
+        try:
+            self.counter.inc(2, ('a',))
+            other = metrics.snapshot()
+            other['test_things_total']['values'] = [[['a'], 5]]
+            with open(os.path.join(metrics.SHARED_DIR, 'metrics-1.json'), 'w') as f:
+                json.dump(other, f)
+            merged = metrics.collect()
+            self.assertEqual(merged['test_things_total']['values'], [[['a'], 7]])
+            metrics.clear_shared()
+            self.assertEqual(os.listdir(metrics.SHARED_DIR), [])
+        finally:
+            shutil.rmtree(metrics.SHARED_DIR)
+            metrics.SHARED_DIR = shared_dir
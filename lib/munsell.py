@@ -4,19 +4,57 @@ import numpy as np
 import math
 import os
 import re
+import threading
 
+import lib.artifacts as artifacts
 import lib.color as color
+import lib.kdtree as kdtree
+import lib.lru as lru
+import lib.metrics as metrics
 import lib.observers as observers
-import sqlite3
+import lib.offload as offload
 
 
 # Munsell reflectance curves are from
 # http://www.munsellcolourscienceforpainters.com/MunsellResources/MunsellResources.html
 
-DATA_FILE = './lib/munsell.csv'
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'munsell.csv')
+
+# Bump this whenever the way the database is built changes, so stale
+# prebuilt artifacts get rebuilt.
+ARTIFACT_VERSION = 4
+
+# How closely (in proportion of one color) to balance complements when
+# mixing grays.
+GRAY_TOLERANCE = 1e-4
+
+# The prebuilt artifact also carries spectra pre-interpolated over this
+# dense grid of hues, values and chromas.
+GRID_HUES = np.arange(1, 81) * 1.25
+GRID_VALUES = np.arange(0, 21) * 0.5
+GRID_CHROMAS = np.arange(0, 17) * 1.0
+
+# Lookups in the lattice, tallied per thread (and so per request; see
+# api.request_metrics): one per sample get_color_for looks at, or one
+# per color in a batch.
+request_lookups = metrics.Tally()
+interpolation_depths = metrics.Histogram(
+    'munsell_interpolation_depth',
+    "How many of hue, value and chroma were interpolated (so how deep get_color_for "
+    "recursed) to reach each sample, or each color of a batch.",
+    buckets=(0, 1, 2, 3))
+chroma_fallbacks = metrics.Counter(
+    'munsell_chroma_fallbacks_total', "Retries at a lower chroma in get_color_for.")
+gamut_clamps = metrics.Counter(
+    'munsell_gamut_clamps_total', "Colors asked for past the edge of the gamut, brought back to it.")
+startup_phases = metrics.Histogram(
+    'munsell_startup_phase_seconds', "Time spent loading or building the database, by phase.",
+    labels=['phase'])
 class MissingColorError(Exception): pass
 
 class MunsellSample(color.Color):
+    __slots__ = ('hue', 'value', 'chroma')
+
     def __init__(self, spectrum, hue=None, value=None, chroma=None, frequencies=observers.frequencies):
         super().__init__(spectrum, 1, name_for_color(hue, value, chroma))
         self.frequencies = frequencies
@@ -24,6 +62,23 @@ class MunsellSample(color.Color):
         self.value = value
         self.chroma = chroma
 
+    @classmethod
+    def view(cls, spectrum, log_spectrum, hue, value, chroma, name):
+        """A sample over spectra someone else holds (a database's rows,
+        say), without copying them."""
+        sample = cls.__new__(cls)
+        sample.spectrum = spectrum
+        sample.proportion = 1
+        sample.name = name
+        sample.frequencies = observers.frequencies
+        sample.imprecise = False
+        sample.clipped = False
+        sample._log_cache = (spectrum, log_spectrum)
+        sample.hue = hue
+        sample.value = value
+        sample.chroma = chroma
+        return sample
+
 
 # Munsell hues are almost-numbered; for the sake of doing math, we'll
 # have to convert the number+letters hue into just-a-number between 1
@@ -52,91 +107,236 @@ def name_for_color(hue, value, chroma):
     return "{0} {1:1.1f}/{2:1.1f}".format(name_for_hue(hue), value, chroma)
 
 name_regex = re.compile('(.*[RYGBP]{1,2}) ?(.*)[\,\/](.*)')
+def parse_name(name):
+    """Hue name, value and chroma from a designation like "5R 3/7";
+    raises ValueError if it can't be read."""
+    match = name_regex.match(name) if isinstance(name, str) else None
+    if not match:
+        raise ValueError("Can't read a Munsell color from {0!r}".format(name))
+    try:
+        return name_for_hue(match[1]), float(match[2]), float(match[3])
+    except (KeyError, ValueError):
+        raise ValueError("Can't read a Munsell color from {0!r}".format(name))
+
 def color_from_name(name):
-    match = name_regex.match(name)
-    return MunsellColor(name_for_hue(match[1]), float(match[2]), float(match[3]))
+    return MunsellColor(*parse_name(name))
+
+
+# Samples sit on a regular grid: a hue every 2.5 steps, a value every
+# step and a chroma every 2 steps -- plus a few strays (values of 8.5,
+# chromas of 1). We index them in a dense lattice of half-value and
+# whole-chroma slots, so finding a sample is just array indexing.
+HUE_STEP = 2.5
+HUE_SLOTS = 40
+VALUE_STEP = 0.5
+VALUE_SLOTS = 21
+CHROMA_STEP = 1.0
+CHROMA_SLOTS = 32
+
+def lattice_slot(x, step, slots, offset=0):
+    """The lattice slot for `x`, or None if `x` falls between slots or
+    outside the lattice."""
+    k = x / step
+    if k != math.floor(k):
+        return None
+    k = int(k) - offset
+    if k < 0 or k >= slots:
+        return None
+    return k
+
+def hue_slot(hue):
+    # Hues run from 2.5 to 100 (10RP); there is no hue 0.
+    return lattice_slot(hue, HUE_STEP, HUE_SLOTS, 1)
+
+def value_slot(value):
+    return lattice_slot(value, VALUE_STEP, VALUE_SLOTS)
+
+def chroma_slot(chroma):
+    return lattice_slot(chroma, CHROMA_STEP, CHROMA_SLOTS)
 
 
-# We'll need to rapidly search by hue, value, and chroma, so we create
-# an in-memory database of color samples.
 class MunsellSampleDatabase():
+    # Samples are stored as columns: a row of `spectra` (and of
+    # `log_spectra`) for each, and its hue, value, chroma and name in
+    # arrays alongside. A MunsellSample is only made when someone asks
+    # for one, as a view over its row.
     def __init__(self):
-        self.create_database()
-        self.load_colors()
-        self.insert_colors()
+        self.create_lattice()
+        with startup_phases.time(('load_colors',)):
+            self.insert_columns(*self.load_colors())
 
     def load_colors(self, file=DATA_FILE):
-        colors = []
+        """Spectra, hues, values and chromas of the samples in the CSV."""
         with open(file) as csvfile:
-            reader = csv.reader(csvfile)
-            arr = [row for row in reader]
-        for row in arr[1:1488]:
-            colors.append(MunsellSample([float(f) for f in row[8:8+36]], numerical_hue(row[2]), *[float(f) for f in row[3:5]]))
-        self.color_list = colors
-
-    def create_database(self):
-        # God knows this is a bad idea
-        conn = sqlite3.connect(":memory:", check_same_thread=False)
-        c = conn.cursor()
-        c.execute('CREATE TABLE colors (hue float, value float, chroma float, i integer)')
-        self.cursor = c
-
-    def insert_colors(self):
-        self.cursor.executemany("INSERT INTO colors VALUES (?, ?, ?, ?)", [(color.hue, color.value, color.chroma, i) for i, color in enumerate(self.color_list)])
+            rows = np.array([row for row in csv.reader(csvfile)][1:1488])
+        spectra = rows[:, 8:8+36].astype(float)
+        values, chromas = rows[:, 3:5].astype(float).T
+        hues = np.array([numerical_hue(hue) for hue in rows[:, 2]], dtype=float)
+        return spectra, hues, values, chromas
+
+    def create_lattice(self):
+        # `lattice` holds a row number for every occupied slot, and -1
+        # everywhere else.
+        self.lattice = np.full((HUE_SLOTS, VALUE_SLOTS, CHROMA_SLOTS), -1, dtype=np.int32)
+        self.occupied = np.zeros(self.lattice.shape, dtype=bool)
+        self.spectra = np.empty((0, len(observers.frequencies)), dtype=color.SPECTRUM_DTYPE)
+        self.log_spectra = np.empty((0, len(observers.frequencies)), dtype=color.SPECTRUM_DTYPE)
+        self.hues = np.empty(0)
+        self.values = np.empty(0)
+        self.chromas = np.empty(0)
+        self.names = np.empty(0, dtype=str)
+        self._gamut = None
+
+    def __len__(self):
+        return len(self.spectra)
+
+    def sample(self, row):
+        return MunsellSample.view(
+            self.spectra[row], self.log_spectra[row], float(self.hues[row]),
+            float(self.values[row]), float(self.chromas[row]), str(self.names[row]))
+
+    @property
+    def color_list(self):
+        """Every sample, in order. Makes a MunsellSample for each; mind."""
+        return [self.sample(row) for row in range(len(self))]
+
+    def insert_samples(self, samples):
+        self.insert_columns(
+            [sample.spectrum for sample in samples],
+            [sample.hue for sample in samples],
+            [sample.value for sample in samples],
+            [sample.chroma for sample in samples],
+            [sample.name for sample in samples])
+
+    def insert_columns(self, spectra, hues, values, chromas, names=None):
+        """Add samples, given as their spectra (as rows), hues, values and
+        chromas, and optionally names (made from the rest if not)."""
+        if not len(spectra):
+            return
+        hues, values, chromas = (np.asarray(x, dtype=float) for x in (hues, values, chromas))
+        if names is None:
+            names = [name_for_color(*hvc) for hvc in zip(hues.tolist(), values.tolist(), chromas.tolist())]
+        start = len(self)
+        spectra = np.asarray(spectra, dtype=color.SPECTRUM_DTYPE)
+        self.spectra = np.concatenate([self.spectra, spectra])
+        self.log_spectra = np.concatenate([self.log_spectra, color.log_spectrum(spectra)])
+        # Samples are views of these rows, so nobody gets to change them.
+        self.spectra.setflags(write=False)
+        self.log_spectra.setflags(write=False)
+        self.hues = np.concatenate([self.hues, hues])
+        self.values = np.concatenate([self.values, values])
+        self.chromas = np.concatenate([self.chromas, chromas])
+        self.names = np.concatenate([self.names, np.asarray(names, dtype=str)])
+        self._gamut = None
+        for i, hvc in enumerate(zip(hues.tolist(), values.tolist(), chromas.tolist()), start):
+            slot = self.slot_for(*hvc)
+            if slot is None:
+                raise ValueError("{0} does not fit in the sample lattice".format(self.names[i]))
+            # First sample in wins, as it did when this was a SQL table.
+            if not self.occupied[slot]:
+                self.lattice[slot] = i
+                self.occupied[slot] = True
+
+    def slot_for(self, hue, value, chroma):
+        slot = (hue_slot(hue), value_slot(value), chroma_slot(chroma))
+        if None in slot:
+            return None
+        return slot
 
     def color_sample_exists(self, hue=None, value=None, chroma=None):
+        if metrics.enabled:
+            request_lookups.add()
         if (value == 1):
             return False
-        pairs = [["hue=?", hue], ["value=?", value], ["chroma=?", chroma]]
-        string = "SELECT i FROM colors WHERE " + " AND ".join([str(q[0]) for q in pairs if q[1] != None])
-        vals = [q[1] for q in pairs if q[1] != None]
-        return not not self.cursor.execute(string, vals).fetchone()
+        slot = []
+        for x, find_slot in [[hue, hue_slot], [value, value_slot], [chroma, chroma_slot]]:
+            if x is None:
+                slot.append(slice(None))
+            else:
+                slot.append(find_slot(x))
+                if slot[-1] is None:
+                    return False
+        return bool(self.occupied[tuple(slot)].any())
 
     def color_sample(self, hue, value, chroma):
-        ind = self.cursor.execute(
-            "SELECT i FROM colors WHERE hue=? AND value=? AND chroma=?",
-            (hue, value, chroma)).fetchone()[0]
-        return self.color_list[ind]
+        if metrics.enabled:
+            request_lookups.add()
+        slot = self.slot_for(hue, value, chroma)
+        if slot is None or not self.occupied[slot]:
+            raise MissingColorError(
+                "No sample for {0}".format(name_for_color(hue, value, chroma)),
+                hue, value, chroma)
+        return self.sample(self.lattice[slot])
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """A database over already-built sample arrays (see to_arrays),
+        sharing their memory rather than copying it."""
+        db = cls.__new__(cls)
+        db.spectra = arrays['spectra']
+        db.log_spectra = arrays['log_spectra']
+        db.lattice = arrays['lattice']
+        db.occupied = db.lattice >= 0
+        db._gamut = None
+        db.hues = arrays['hues']
+        db.values = arrays['values']
+        db.chromas = arrays['chromas']
+        db.names = arrays['names']
+        return db
+
+    def to_arrays(self):
+        return {
+            'spectra': self.spectra,
+            'log_spectra': self.log_spectra,
+            'lattice': self.lattice,
+            'hues': self.hues,
+            'values': self.values,
+            'chromas': self.chromas,
+            'names': self.names,
+        }
+
+    def gamut(self):
+        """The highest even chroma sampled at each hue and value slot, or
+        -1 where there are no samples at all."""
+        if self._gamut is None:
+            evens = self.occupied[:, :, ::int(2 / CHROMA_STEP)]
+            highest = evens.shape[2] - 1 - np.argmax(evens[:, :, ::-1], axis=2)
+            self._gamut = np.where(evens.any(axis=2), highest * 2.0 * CHROMA_STEP, -1)
+        return self._gamut
 
     def max_chroma_sample(self, hue, value):
-        ind = self.cursor.execute(
-            "SELECT i FROM colors WHERE hue=? AND value=? ORDER BY chroma DESC",
-            (hue, value)).fetchone()
-        ind = ind[0]
-        return self.color_list[ind]
+        slot = (hue_slot(hue), value_slot(value))
+        chromas = [] if None in slot else np.flatnonzero(self.occupied[slot])
+        if not len(chromas):
+            raise MissingColorError(
+                "No samples for {0} {1}".format(name_for_hue(hue), value),
+                hue, value, None)
+        return self.sample(self.lattice[slot + (chromas[-1],)])
 
 
 class ExpandedMunsellSampleDatabase(MunsellSampleDatabase):
     def __init__(self):
         super().__init__()
-        self.insert_overchromas()
-        self.insert_grays()
-        self.insert_whites_and_blacks()
+        with startup_phases.time(('insert_overchromas',)):
+            self.insert_overchromas()
+        with startup_phases.time(('insert_grays',)):
+            self.insert_grays()
+        with startup_phases.time(('insert_whites_and_blacks',)):
+            self.insert_whites_and_blacks()
 
     # Use titanium white and bone black for 0 and 10 values. Lies.
+    # At every hue, chroma 0 and then 2, a black and a white, all named
+    # for the samples they copy.
     def insert_whites_and_blacks(self):
-        white = self.color_list[1485]
-        black = self.color_list[1486]
-        i = len(self.color_list) - 1
-        for doublehue in range(5, 201, 5):
-            for chroma in range(0, 3, 2):
-                hue = doublehue / 2.0
-
-                nblack = black.p(1)
-                nblack.hue = hue
-                nblack.value = 0
-                nblack.chroma = chroma
-                self.color_list.append(nblack)
-                i += 1
-                self.cursor.execute("INSERT INTO colors VALUES (?, ?, ?, ?)", (hue, 0, chroma, i))
-
-                nwhite = white.p(1)
-                nwhite.hue = hue
-                nwhite.value = 10
-                nwhite.chroma = chroma
-                self.color_list.append(nwhite)
-                i += 1
-                self.cursor.execute("INSERT INTO colors VALUES (?, ?, ?, ?)", (hue, 10, chroma, i))
+        white = self.sample(1485)
+        black = self.sample(1486)
+        hues = np.arange(5, 201, 5) / 2.0
+        self.insert_columns(
+            np.tile([black.spectrum, white.spectrum], (2 * len(hues), 1)),
+            np.repeat(hues, 4),
+            np.tile([0, 10, 0, 10], len(hues)),
+            np.tile([0, 0, 2, 2], len(hues)),
+            np.tile([black.name, white.name], 2 * len(hues)))
 
     ### GRAYS ###
     # The sample data contains no 0-chroma samples. I'd like spectra
@@ -145,46 +345,25 @@ class ExpandedMunsellSampleDatabase(MunsellSampleDatabase):
     # flatten the resulting spectra to the average value. NOT perfect,
     # lots of easily disproven assumptions, there, but it's what I can
     # do
-    def how_gray(self, color):
-        rgb = color.to_rgb()
-        diff = max(rgb) - min(rgb)
-        return 1 - diff
-
-    def better(self, mix_a, mix_b):
-        return self.how_gray(mix_a) > self.how_gray(mix_b)
-
-    def find_grayest(self, a, b):
-        mix = color.Mix([a, b])
-        ap = 1
-        new_mix = color.Mix([a.p(1.05), b])
-        # todo binary search
-        if self.better(new_mix, mix):
-            while self.better(new_mix, mix):
-                ap += .05
-                mix = new_mix
-                new_mix = color.Mix([a.p(ap), b])
-        else:
-            new_mix = color.Mix([a.p(0.95), b])
-            while self.better(new_mix, mix):
-                ap -= .05
-                mix = new_mix
-                new_mix = color.Mix([a.p(ap), b])
+    def find_grayest(self, a, b, tolerance=GRAY_TOLERANCE):
+        proportion = color.neutral_proportions(a.log_spectrum, b.log_spectrum, tolerance)[0]
+        mix = color.Mix([a.p(proportion), b.p(1 - proportion)])
         flat_spectrum = [sum(mix.spectrum)/len(mix.spectrum)] * len(mix.spectrum)
         return MunsellSample(flat_spectrum, a.hue, a.value, 0)
 
-    def insert_grays(self):
+    def insert_grays(self, tolerance=GRAY_TOLERANCE):
+        # Every hue/value pair is balanced against its complement at
+        # once.
         chroma = 2
-        i = len(self.color_list) - 1
-        for doublehue in range(5, 201, 5):
-            hue = doublehue / 2.0
-            for value in range(2, 10):
-                this_color = self.get_color_for(hue, value, chroma)
-                comp = self.get_color_for(complement(hue), value, chroma)
-                sample = self.find_grayest(this_color, comp)
-
-                self.color_list.append(sample)
-                i += 1
-                self.cursor.execute("INSERT INTO colors VALUES (?, ?, ?, ?)", (hue, value, 0, i))
+        hues, values = np.meshgrid(np.arange(5, 201, 5) / 2.0, np.arange(2, 10), indexing='ij')
+        hues, values = hues.ravel(), values.ravel()
+        log_a = color.log_spectrum(self.get_spectra_for(hues, values, chroma))
+        log_b = color.log_spectrum(self.get_spectra_for(complement(hues), values, chroma))
+        proportions = color.neutral_proportions(log_a, log_b, tolerance)[:, None]
+        grays = np.exp(proportions * log_a + (1 - proportions) * log_b).mean(axis=1)
+        self.insert_columns(
+            np.repeat(grays[:, None], len(observers.frequencies), axis=1),
+            hues, values, np.zeros(len(hues)))
 
     ### OVERCHROMAS ###
     # Now the hax really begin :( There are some high-chroma values
@@ -207,26 +386,21 @@ class ExpandedMunsellSampleDatabase(MunsellSampleDatabase):
 
 
     def insert_overchromas(self):
-        i = len(self.color_list) - 1
-        insertions = []
+        # Overchromas are calculated from the existing samples only, so
+        # they all go in at once at the end.
+        samples = []
         for doublehue in range(5, 201, 5):
             hue = doublehue / 2.0
             for value in range(2, 10):
                 if value > 2:
                     c = self.calculate_overchroma(hue, value, -1)
                     if c:
-                        self.color_list.append(c)
-                        i += 1
-                        insertions.append([hue, value, c.chroma, i])
+                        samples.append(c)
                 if value < 8:
                     c = self.calculate_overchroma(hue, value, 1)
                     if c:
-                        self.color_list.append(c)
-                        i += 1
-                        insertions.append([hue, value, c.chroma, i])
-
-        for it in insertions:
-            self.cursor.execute("INSERT INTO colors VALUES (?, ?, ?, ?)", it)
+                        samples.append(c)
+        self.insert_samples(samples)
 
 
 class InterpolatedMunsellColorDatabase(ExpandedMunsellSampleDatabase):
@@ -234,6 +408,40 @@ class InterpolatedMunsellColorDatabase(ExpandedMunsellSampleDatabase):
     # are methods for interpolating between samples. We restrict
     # interpolation to between on-axis values, as there's no
     # conversion factor between hue/chroma/value step sizes.
+    def __init__(self):
+        super().__init__()
+        self.grid = None
+        self.grid_chromas = None
+        self.nearest = None
+        self.nearest_arrays = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        db = super().from_arrays(arrays)
+        db.grid = arrays['grid']
+        db.grid_chromas = arrays['grid_chromas']
+        db.nearest = None
+        db.nearest_arrays = {key[len(NEAREST_PREFIX):]: array for key, array in arrays.items()
+                             if key.startswith(NEAREST_PREFIX)}
+        return db
+
+    def to_arrays(self):
+        arrays = super().to_arrays()
+        arrays['grid'], arrays['grid_chromas'] = self.dense_grid()
+        for key, array in self.nearest_index().to_arrays().items():
+            arrays[NEAREST_PREFIX + key] = array
+        return arrays
+
+    def nearest_index(self):
+        """The NearestIndex over the grid: from the prebuilt arrays if
+        there are any, otherwise built on first use."""
+        if self.nearest is None:
+            if self.nearest_arrays:
+                self.nearest = NearestIndex.from_arrays(self.nearest_arrays)
+            else:
+                self.nearest = NearestIndex(self)
+        return self.nearest
+
     def nearest_hues(self, hue):
         # There is a sample hue every 2.5 steps, so round to the nearest 2.5
         low_hue = math.floor(hue * 1/2.5)*2.5
@@ -300,6 +508,8 @@ class InterpolatedMunsellColorDatabase(ExpandedMunsellSampleDatabase):
         if self.color_sample_exists(hue):
             if self.color_sample_exists(hue, value):
                 if self.color_sample_exists(hue, value, chroma):
+                    if metrics.enabled:
+                        interpolation_depths.observe(depth)
                     return self.color_sample(hue, value, chroma)
                 else:
                     return self.mix_to_chroma(hue, value, chroma, depth)
@@ -310,9 +520,16 @@ class InterpolatedMunsellColorDatabase(ExpandedMunsellSampleDatabase):
 
 
     # For many, many, many applications, we want to gracefully fail
-    # when there is no color at the desired chroma; here, if a color
-    # is non-interpolatable, we try again at a lower chroma.
+    # when there is no color at the desired chroma. Chromas past the
+    # edge of the gamut are brought back to it before interpolating;
+    # if a color still is non-interpolatable (the few spots where the
+    # lowest chromas are missing), we try again at a lower chroma.
     def get_color_for(self, hue, value, chroma):
+        max_chroma = self.max_chroma_for(hue, value)
+        if chroma > max_chroma:
+            if metrics.enabled:
+                gamut_clamps.inc()
+            chroma = max_chroma
         try:
             return self._get_color_for(hue, value, chroma, 0)
         except MissingColorError as err:
@@ -320,9 +537,207 @@ class InterpolatedMunsellColorDatabase(ExpandedMunsellSampleDatabase):
             if failed_chroma < 1:
                 raise
             else:
+                if metrics.enabled:
+                    chroma_fallbacks.inc()
                 lower_chroma, _ = self.nearest_chromas(chroma - 0.01)
                 return self.get_color_for(hue, value, lower_chroma)
 
+    ### THE GAMUT ###
+    # How far out the chroma goes at every hue and value: the highest
+    # even chroma sampled at each point of the lattice, and in between,
+    # the lowest of those at the points a color would be interpolated
+    # from. Any chroma up to that can be interpolated, and none past it
+    # can, so lookups start there rather than at the chroma asked for.
+    def max_chroma_for(self, hue, value):
+        """max_chromas for one hue and value, found the way
+        _get_color_for finds its samples."""
+        gamut = self.gamut()
+        hue = numerical_hue(hue)
+        hue_slots = [hue_slot(hue if hue != 0 else 100)]
+        if hue_slots[0] is None:
+            hue_slots = [hue_slot(x % 100 or 100) for x in self.nearest_hues(hue)]
+        edge = math.inf
+        for slot in hue_slots:
+            value_slots = [None if value == 1 else value_slot(value)]
+            if value_slots[0] is None or gamut[slot, value_slots[0]] < 0:
+                low, high = self.nearest_values(value)
+                value_slots = [value_slot(low)] if low == value else [value_slot(low), value_slot(high)]
+            for other in value_slots:
+                if other is None or gamut[slot, other] < 0:
+                    return math.nan
+                edge = min(edge, float(gamut[slot, other]))
+        return edge
+
+    def max_chromas(self, hues, values):
+        """The highest chroma that can be interpolated at each of `hues`
+        and `values` (which broadcast against each other); NaN where
+        there are no colors at any chroma."""
+        hues, values = np.broadcast_arrays(np.asarray(hues, dtype=float), np.asarray(values, dtype=float))
+        shape = hues.shape
+        hue_slots, hue_weights = self.hue_corners(hues.ravel())
+        value_slots, value_weights = self.value_corners(hue_slots, values.ravel()[:, None])
+        hue_slots = np.broadcast_to(hue_slots[:, :, None], value_slots.shape)
+        weights = hue_weights[:, :, None] * value_weights
+        edges = np.where(value_slots < 0, -1, self.gamut()[hue_slots, np.maximum(value_slots, 0)])
+        edges = np.where(weights > 0, edges, np.inf).reshape(len(edges), -1).min(axis=1)
+        if metrics.enabled:
+            request_lookups.add(len(edges))
+        return np.where(edges < 0, np.nan, edges).reshape(shape)
+
+    ### BATCHES ###
+    # The same interpolation as get_color_for, for whole arrays of
+    # colors at once. Every interpolated color is a weighted geometric
+    # mean of at most eight samples -- two hues by two values by two
+    # chromas -- so we find those corners and their weights for every
+    # color, then blend them all in one go.
+    def get_spectra_for(self, hues, values, chromas):
+        """Spectra for arrays of hues, values and chromas (which broadcast
+        against each other), with a trailing axis of 36 reflectances.
+        Colors that can't be found at any chroma come back as NaNs."""
+        spectra, _ = self.resolve_spectra(hues, values, chromas)
+        return spectra
+
+    def resolve_spectra(self, hues, values, chromas):
+        """Like get_spectra_for, but also returns the chromas actually
+        reached, after falling back to lower chromas like get_color_for."""
+        hues, values, chromas = batch_arrays(hues, values, chromas)
+        shape = hues.shape
+        hues, values, chromas = hues.ravel(), values.ravel(), chromas.ravel()
+
+        spectra = np.full((len(hues), self.spectra.shape[1]), np.nan, dtype=self.spectra.dtype)
+        actual_chromas = np.full(len(hues), np.nan)
+        attempts = np.fmin(chromas, self.max_chromas(hues, values))
+        if metrics.enabled:
+            gamut_clamps.inc(int((attempts < chromas).sum()))
+        pending = np.arange(len(hues))
+        while len(pending):
+            found, blended = self.blend_corners(hues[pending], values[pending], attempts[pending])
+            done = pending[found]
+            spectra[done] = blended
+            actual_chromas[done] = attempts[done]
+            # Like get_color_for, try again at the next chroma down. (Only
+            # where the gamut has holes, at the lowest chromas.)
+            pending = pending[~found]
+            attempts[pending] = np.floor((attempts[pending] - 0.01) / 2) * 2.0
+            pending = pending[attempts[pending] >= 0]
+        return spectra.reshape(shape + (-1,)), actual_chromas.reshape(shape)
+
+    def blend_corners(self, hues, values, chromas):
+        hue_slots, hue_weights = self.hue_corners(hues)
+        value_slots, value_weights = self.value_corners(hue_slots, values[:, None])
+        chroma_slots, chroma_weights = self.chroma_corners(
+            hue_slots[:, :, None], value_slots, chromas[:, None, None])
+
+        shape = chroma_slots.shape
+        hue_slots = np.broadcast_to(hue_slots[:, :, None, None], shape)
+        value_slots = np.broadcast_to(value_slots[:, :, :, None], shape)
+        weights = hue_weights[:, :, None, None] * value_weights[:, :, :, None] * chroma_weights
+        missing = (hue_slots < 0) | (value_slots < 0) | (chroma_slots < 0)
+        found = ~(missing & (weights > 0)).reshape(len(hues), -1).any(axis=1)
+        if metrics.enabled:
+            request_lookups.add(len(hues))
+            self.observe_depths(hue_weights, value_weights, chroma_weights, found)
+
+        # Only blend the colors we found; the rest go around again.
+        samples = self.lattice[hue_slots, value_slots, chroma_slots].reshape(len(hues), -1)[found]
+        weights = weights.reshape(len(hues), -1)[found].astype(self.log_spectra.dtype)
+        logs = np.zeros((len(samples), self.spectra.shape[1]), dtype=self.log_spectra.dtype)
+        for corner in range(samples.shape[1]):
+            logs += weights[:, corner, None] * self.log_spectra[samples[:, corner]]
+        return found, np.exp(logs)
+
+    def observe_depths(self, hue_weights, value_weights, chroma_weights, found):
+        # An axis was interpolated where both of a color's corners on it
+        # count (for any of the corners before it).
+        depths = ((hue_weights > 0).all(axis=1).astype(int) +
+                  (value_weights > 0).all(axis=2).any(axis=1) +
+                  (chroma_weights > 0).all(axis=3).reshape(len(found), -1).any(axis=1))
+        for depth, count in enumerate(np.bincount(depths[found], minlength=4).tolist()):
+            if count:
+                interpolation_depths.observe(depth, count=count)
+
+    def hue_corners(self, hues):
+        hues = np.where(hues == 0, 100, hues)
+        low = np.floor(hues / HUE_STEP) * HUE_STEP
+        high = np.ceil(hues / HUE_STEP) * HUE_STEP
+        high_hue = high % 100
+        return axis_corners(
+            hues, low, high, low == high,
+            hues / HUE_STEP - 1,
+            np.where(low == 0, 100, low) / HUE_STEP - 1,
+            np.where(high_hue == 0, 100, high_hue) / HUE_STEP - 1,
+            HUE_SLOTS)
+
+    def value_corners(self, hue_slots, values):
+        values = np.broadcast_to(values, hue_slots.shape)
+        slices = self.occupied.any(axis=2)
+        positions = values / VALUE_STEP
+        exact = on_lattice(positions, VALUE_SLOTS) & (values != 1)
+        exact &= slices[hue_slots, np.where(exact, positions, 0).astype(int)]
+        low = np.floor(values)
+        low = np.where(low == 1, 0, low)
+        high = np.ceil(values)
+        high = np.where(high == 1, 2, high)
+        slots, weights = axis_corners(
+            values, low, high, exact,
+            positions, low / VALUE_STEP, high / VALUE_STEP, VALUE_SLOTS)
+        filled = slices[hue_slots[..., None], slots]
+        return np.where(filled | (weights == 0), slots, -1), weights
+
+    def chroma_corners(self, hue_slots, value_slots, chromas):
+        chromas = np.broadcast_to(chromas, value_slots.shape)
+        hue_slots = np.broadcast_to(hue_slots, value_slots.shape)
+        positions = chromas / CHROMA_STEP
+        exact = on_lattice(positions, CHROMA_SLOTS)
+        exact &= self.occupied[hue_slots, value_slots, np.where(exact, positions, 0).astype(int)]
+        low = np.floor(chromas / 2) * 2.0
+        high = np.ceil(chromas / 2) * 2.0
+        slots, weights = axis_corners(
+            chromas, low, high, exact,
+            positions, low / CHROMA_STEP, high / CHROMA_STEP, CHROMA_SLOTS)
+        filled = self.occupied[hue_slots[..., None], value_slots[..., None], slots]
+        return np.where(filled | (weights == 0), slots, -1), weights
+
+    def dense_grid(self):
+        """Spectra and reached chromas over GRID_HUES x GRID_VALUES x
+        GRID_CHROMAS, interpolated on first use unless prebuilt."""
+        if self.grid is None:
+            self.grid, self.grid_chromas = self.resolve_spectra(
+                GRID_HUES[:, None, None], GRID_VALUES[None, :, None], GRID_CHROMAS)
+        return self.grid, self.grid_chromas
+
+
+def batch_arrays(hues, values, chromas):
+    """Hues, values and chromas as broadcast float arrays; hues may be
+    numbers or names."""
+    hues = np.asarray(hues)
+    if hues.dtype.kind in 'OSU':
+        hues = np.vectorize(numerical_hue, otypes=[float])(hues)
+    return np.broadcast_arrays(
+        hues.astype(float),
+        np.asarray(values, dtype=float),
+        np.asarray(chromas, dtype=float))
+
+def on_lattice(positions, size):
+    return (positions == np.floor(positions)) & (positions >= 0) & (positions < size)
+
+def axis_corners(xs, low, high, exact, positions, low_positions, high_positions, size):
+    """Lattice slots and mixing weights for the two corners along one
+    axis, mirroring the mix_to_* methods: an exact sample takes all the
+    weight, anything else mixes the samples either side. Unused corners
+    get weight 0; corners with no sample get slot -1."""
+    mixed = ~exact & (low != high)
+    total = np.where(mixed, (xs - low) + (high - xs), 1)
+    weights = np.stack([
+        np.where(mixed, (high - xs) / total, 1.0),
+        np.where(mixed, (xs - low) / total, 0.0)], axis=-1)
+    positions = np.stack([
+        np.where(exact, positions, low_positions),
+        np.where(mixed, high_positions, 0)], axis=-1)
+    fits = on_lattice(positions, size)
+    fits[..., 0] &= exact | mixed
+    return np.where(fits, positions, -1).astype(int), weights
+
 
 ###
 # Here's the fun stuff! Lighting, ladders, mixing, etc.
@@ -337,15 +752,26 @@ class MunsellColor(color.Color):
         self.proportion = 1
         self.imprecise = False
         self.clipped = False
+        self._spectrum = None
 
+    # Resolved once per color, through the shared cache.
     @property
     def spectrum(self):
-        col = colors.get_color_for(self.hue, self.value, self.chroma)
+        if self._spectrum is None:
+            self.resolve_from(cached_color_for(self.hue, self.value, self.chroma))
+        return self._spectrum
+
+    # Sent to other processes (the compute pool's) as just its hue, value
+    # and chroma, to be resolved there.
+    def __reduce__(self):
+        return (MunsellColor, (self.hue, self.value, self.chroma))
+
+    def resolve_from(self, col):
         if col.chroma != self.chroma:
             self.imprecise = True
             self.actual_chroma = col.chroma
-            self.name = col.name
-        return col.spectrum
+            self.name = name_for_color(self.hue, self.value, col.chroma)
+        self._spectrum = col.spectrum
 
     def complement(self):
         return MunsellColor(complement(self.hue), self.value, self.chroma)
@@ -354,13 +780,15 @@ class MunsellColor(color.Color):
         return MunsellColor(self.hue, 2 + self.value * 0.8, self.chroma)
 
     def in_shadow(self, sky_color=None):
+        return shadow_mix(*self.shadow_parts(sky_color))
+
+    def shadow_parts(self, sky_color=None):
         if not sky_color:
             sky_color = MunsellColor("5PB", self.value * 0.8, 10)
-        shade = MunsellColor(self.hue, self.value * 0.8, self.chroma)
-        return color.Mix([sky_color.p(0.3), shade])
+        return sky_color, MunsellColor(self.hue, self.value * 0.8, self.chroma)
 
-    def stats_dict(self):
-        d = super().stats_dict()
+    def rgb_stats(self, rgb, rgb255, hex):
+        d = super().rgb_stats(rgb, rgb255, hex)
         d["hue"] = self.hue
         d["value"] = self.value
         d["chroma"] = self.actual_chroma
@@ -370,6 +798,11 @@ class MunsellColor(color.Color):
 def complement(hue):
     return (hue + 50) % 100
 
+def shadow_mix(sky_color, shade):
+    """A shadow from its shadow_parts. Mixing needs their spectra, so
+    resolve the parts first to do many at once."""
+    return color.Mix([sky_color.p(0.3), shade])
+
 
 def numerical_mix(a, b, proportion, shortest_route=True):
 
@@ -397,23 +830,362 @@ def numerical_mix(a, b, proportion, shortest_route=True):
     chroma = additive_proportional(a.chroma, b.chroma, proportion)
     return MunsellColor(hue, value, chroma)
 
+STREAM_CHUNK_SIZE = 256
+
+# Ladders and rainbows work on every step at once: numerical_mix's
+# arithmetic, over an array of proportions.
+def mix_hues(a, b, proportions, shortest_route=True):
+    """numerical_mix's hue at each of `proportions` (of `a`, the rest
+    `b`), going the short way around the hue circle unless not
+    `shortest_route`."""
+    if shortest_route and abs(a - b) < 50:
+        return a * proportions + b * (1 - proportions)
+    if a < b:
+        return ((a + 100) * proportions + b * (1 - proportions)) % 100
+    return (a * proportions + (b + 100) * (1 - proportions)) % 100
+
+def mix_steps(a, b, proportions, shortest_route=True):
+    """The hues, values and chromas of numerical_mix(a, b, proportion)
+    for each of `proportions`, as arrays."""
+    return (mix_hues(a.hue, b.hue, proportions, shortest_route),
+            a.value * proportions + b.value * (1 - proportions),
+            a.chroma * proportions + b.chroma * (1 - proportions))
+
+def ladder_proportions(steps, start=0, stop=None):
+    # Of the end color, at each step from `start` up to `stop`.
+    return np.arange(start, steps if stop is None else stop) / (steps - 1.0)
+
+def rainbow_ends(value, chroma, offset):
+    return (MunsellColor((offset - .01) % 100, value, chroma),
+            MunsellColor(offset, value, chroma))
+
 def numerical_ladder(a, b, steps):
-    count = steps - 1
-    return [numerical_mix(b, a, float(x)/count) for x in range(steps)]
+    hues, values, chromas = mix_steps(b, a, ladder_proportions(steps))
+    return [MunsellColor(*hvc) for hvc in zip(hues.tolist(), values.tolist(), chromas.tolist())]
 
 def mix_ladder(a, b, steps):
     count = steps - 1.0
     return [color.Mix([b.p(x/count), a.p((count-x)/count)]) for x in range(steps)]
 
 def rainbow(value, chroma, steps, offset=0):
-    a = MunsellColor(offset, value, chroma)
-    b = MunsellColor((offset - .01) % 100, value, chroma)
-    return [numerical_mix(b, a, float(x)/steps, False) for x in range(steps)]
+    b, a = rainbow_ends(value, chroma, offset)
+    hues, values, chromas = mix_steps(b, a, np.arange(steps) / float(steps), False)
+    return [MunsellColor(*hvc) for hvc in zip(hues.tolist(), values.tolist(), chromas.tolist())]
+
+# And as stats_dicts, which is what gets sent back, without a color
+# object per step: Munsell steps are resolved as one batch, and mixes
+# are mixed as one. Long ones are worked on in pieces by the compute
+# pool, if there is one.
+def ladder_span(method, a, b, steps, start, stop):
+    if method == 'mix':
+        count = steps - 1.0
+        x = np.arange(start, stop)
+        return color.mix_stats([b, a], np.column_stack([x / count, (count - x) / count]))
+    return swatch_stats(*mix_steps(b, a, ladder_proportions(steps, start, stop)))
+
+def ladder_stats(a, b, steps, method='munsell'):
+    return offload.run(ladder_span, (method, a, b, steps), steps)
+
+def rainbow_span(value, chroma, steps, offset, start, stop):
+    b, a = rainbow_ends(value, chroma, offset)
+    return swatch_stats(*mix_steps(b, a, np.arange(start, stop) / float(steps), False))
+
+def rainbow_stats(value, chroma, steps, offset=0):
+    return offload.run(rainbow_span, (value, chroma, steps, offset), steps)
+
+def stats_spans(span, args, total, size=STREAM_CHUNK_SIZE):
+    """span(*args, start, stop) for `size` items at a time, for streaming
+    ladder_span and rainbow_span out."""
+    for start in range(0, total, size):
+        yield span(*args, start, min(start + size, total))
 
 
 def page(hue, value_steps=10, chroma_steps=10):
-    return [[MunsellColor(hue, value, chroma) for chroma in np.arange(0, 16.1, 16.0/(chroma_steps-1))] for value in np.arange(1, 9.1, 8.0/(value_steps-1))]
+    values, chromas = page_grid(value_steps, chroma_steps)
+    this_page = [[MunsellColor(hue, value, chroma) for chroma in chromas] for value in values]
+    resolve([c for row in this_page for c in row])
+    return this_page
+
 
+###
+# Pages and the atlas, as payloads. A page is value_steps rows of
+# chroma_steps colors at one hue, and the atlas is a page for every hue
+# in the book. They're resolved as one grid and converted to rgb as
+# arrays, without a MunsellColor per swatch, and each page is cached
+# once made, so an atlas is mostly served from the cache. The cache is
+# bounded by swatches rather than pages: a swatch's stats_dict is most
+# of a kilobyte, and a 100x100 page is as big as a hundred 10x10 ones.
+
+ATLAS_HUES = (np.arange(HUE_SLOTS) + 1) * HUE_STEP
+page_cache = lru.LRUCache(int(os.environ.get('MUNSELL_PAGE_CACHE_SWATCHES', 50000)),
+                          sizeof=lambda this_page: len(this_page) * len(this_page[0]))
+
+def page_grid(value_steps, chroma_steps):
+    return np.linspace(1, 9, value_steps), np.linspace(0, 16, chroma_steps)
+
+def page_stats(hues, value_steps=10, chroma_steps=10):
+    """The stats_dicts of the page at each of `hues`, like stats_dicts of
+    page()."""
+    hues = [numerical_hue(hue) for hue in hues]
+    keys = [(round(hue, CACHE_DIGITS), value_steps, chroma_steps) for hue in hues]
+    pages = [page_cache.get(key) for key in keys]
+    missing = {key: hue for key, hue, this_page in zip(keys, hues, pages) if this_page is None}
+    if missing:
+        made = grid_stats(list(missing.values()), *page_grid(value_steps, chroma_steps))
+        for key, this_page in zip(missing, made):
+            page_cache.put(key, this_page)
+        made = dict(zip(missing, made))
+        pages = [made[key] if this_page is None else this_page
+                 for key, this_page in zip(keys, pages)]
+    return pages
+
+def grid_stats(hues, values, chromas):
+    """The MunsellColor stats_dict of every hue, value and chroma, nested
+    by hue, then value, then chroma."""
+    rows = offload.run(grid_rows, (hues, values, chromas), len(hues) * len(values), len(chromas))
+    return [rows[i:i + len(values)] for i in range(0, len(rows), len(values))]
+
+def grid_rows(hues, values, chromas, start, stop):
+    """Rows `start` up to `stop` of the grid, a row (of every chroma) for
+    each value at each hue in turn."""
+    pairs = [(hue, value) for hue in hues for value in values.tolist()][start:stop]
+    row_hues = np.array([hue for hue, _ in pairs], dtype=float)
+    row_values = np.array([value for _, value in pairs], dtype=float)
+    shape = (len(pairs), len(chromas))
+    swatches = swatch_stats(np.broadcast_to(row_hues[:, None], shape).ravel(),
+                            np.broadcast_to(row_values[:, None], shape).ravel(),
+                            np.broadcast_to(chromas, shape).ravel())
+    return [swatches[i:i + len(chromas)] for i in range(0, len(swatches), len(chromas))]
+
+def swatch_stats(hues, values, chromas):
+    """The MunsellColor stats_dict of each hue, value and chroma (equal
+    length arrays), resolved together."""
+    spectra, actual_chromas = colors.resolve_spectra(hues, values, chromas)
+    if np.isnan(actual_chromas).any():
+        raise MissingColorError("Not every color asked for exists")
+    clipped, rgb, rgb255 = color.SpectrumBatch(spectra).rgb_arrays()
+    return [{
+        "name": name_for_color(hue, value, actual_chroma),
+        "rgb": swatch_rgb,
+        "rgb255": swatch_rgb255,
+        "hex": "#" + swatch_hex,
+        "imprecise": swatch_clipped or actual_chroma != chroma,
+        "clipped": swatch_clipped,
+        "hue": hue,
+        "value": value,
+        "chroma": actual_chroma,
+        "attempted_chroma": chroma,
+    } for hue, value, chroma, actual_chroma, swatch_clipped, swatch_rgb, swatch_rgb255, swatch_hex in zip(
+        hues.tolist(), values.tolist(), chromas.tolist(), actual_chromas.tolist(), clipped.tolist(),
+        rgb.tolist(), rgb255.tolist(), color.hex_codes(rgb255))]
+
+
+def gamut_stats(hues, values=GRID_VALUES):
+    """The highest chroma there is at each of `values` (every half step,
+    by default) for each of `hues`; None where there are no colors."""
+    hues = [numerical_hue(hue) % 100 for hue in hues]
+    values = np.asarray(values, dtype=float)
+    if not np.isfinite(values).all():
+        raise ValueError("Values must be numbers")
+    edges = colors.max_chromas(np.array(hues, dtype=float)[:, None], values[None, :])
+    return [{
+        "hue": name_for_hue(hue),
+        "values": [{"value": value, "max_chroma": None if math.isnan(edge) else edge}
+                   for value, edge in zip(values.tolist(), hue_edges)],
+    } for hue, hue_edges in zip(hues, edges.tolist())]
 
 
-colors = InterpolatedMunsellColorDatabase()
+###
+# Reverse lookups: which Munsell colors are nearest a hex code, or a
+# measured spectrum. Every color on the dense grid that's really there
+# (rather than a fallback to a lower chroma) goes into one k-d tree by
+# its CIELAB coordinates, and into another by its spectrum, compressed
+# to its first few principal components.
+
+SPECTRAL_COMPONENTS = 6
+# The index is saved in the artifact too, under this prefix, so workers
+# map it rather than each building their own.
+NEAREST_PREFIX = 'nearest_'
+
+class NearestIndex():
+    def __init__(self, db):
+        grid, grid_chromas = db.dense_grid()
+        hues, values, chromas = np.meshgrid(GRID_HUES, GRID_VALUES, GRID_CHROMAS, indexing='ij')
+        real = grid_chromas == chromas
+        # Blacks (and whites) come out the same at every hue; keep one.
+        spectra, first = np.unique(grid[real], axis=0, return_index=True)
+        first.sort()
+        spectra = grid[real][first]
+        self.hues, self.values, self.chromas = hues[real][first], values[real][first], chromas[real][first]
+
+        self.lab_tree = kdtree.KDTree(color.SpectrumBatch(spectra).to_lab())
+        self.spectral_mean = spectra.mean(axis=0)
+        _, _, components = np.linalg.svd(spectra - self.spectral_mean, full_matrices=False)
+        self.spectral_basis = components[:SPECTRAL_COMPONENTS].T
+        self.spectral_tree = kdtree.KDTree(self.compress(spectra))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        index.hues, index.values, index.chromas = arrays['hues'], arrays['values'], arrays['chromas']
+        index.spectral_mean, index.spectral_basis = arrays['spectral_mean'], arrays['spectral_basis']
+        for name in ('lab_tree', 'spectral_tree'):
+            prefix = name + '_'
+            setattr(index, name, kdtree.KDTree.from_arrays(
+                {key[len(prefix):]: array for key, array in arrays.items() if key.startswith(prefix)}))
+        return index
+
+    def to_arrays(self):
+        arrays = {
+            'hues': self.hues,
+            'values': self.values,
+            'chromas': self.chromas,
+            'spectral_mean': self.spectral_mean,
+            'spectral_basis': self.spectral_basis,
+        }
+        for name in ('lab_tree', 'spectral_tree'):
+            for key, array in getattr(self, name).to_arrays().items():
+                arrays[name + '_' + key] = array
+        return arrays
+
+    def compress(self, spectra):
+        return (np.asarray(spectra, dtype=float) - self.spectral_mean).dot(self.spectral_basis)
+
+    def nearest_to_lab(self, labs, k=1):
+        """Distances (delta E) and indices of the k nearest colors to each
+        of `labs`."""
+        return self.lab_tree.query(labs, k)
+
+    def nearest_to_spectra(self, spectra, k=1):
+        """Distances (between compressed spectra) and indices of the k
+        nearest colors to each of `spectra`."""
+        return self.spectral_tree.query(self.compress(spectra), k)
+
+    def matches(self, distances, indices):
+        return [[{
+            "name": name_for_color(self.hues[i], self.values[i], self.chromas[i]),
+            "hue": float(self.hues[i]),
+            "value": float(self.values[i]),
+            "chroma": float(self.chromas[i]),
+            "distance": distance,
+        } for distance, i in zip(row_distances, row_indices)]
+            for row_distances, row_indices in zip(distances.tolist(), indices.tolist())]
+
+
+###
+# The prebuilt artifact. Building the database means parsing the CSV,
+# extrapolating overchromas and searching out grays; every worker
+# would pay for that on boot, so we do it once and save the result.
+
+def artifact_sources():
+    return [DATA_FILE, observers.data_file]
+
+def artifact_name():
+    # Each precision has its own.
+    if color.SPECTRUM_DTYPE == np.float64:
+        return 'munsell'
+    return 'munsell-{0}'.format(color.SPECTRUM_DTYPE)
+
+def build_artifact():
+    db = InterpolatedMunsellColorDatabase()
+    path = artifacts.save(artifact_name(), ARTIFACT_VERSION, artifact_sources(), db.to_arrays())
+    return db, path
+
+def load_colors():
+    """The interpolated database, from the prebuilt artifact if it's
+    current; otherwise built, and saved for next time if we can."""
+    with startup_phases.time(('load_artifact',)):
+        arrays = artifacts.load(artifact_name(), ARTIFACT_VERSION, artifact_sources())
+        if arrays is not None:
+            return InterpolatedMunsellColorDatabase.from_arrays(arrays)
+    with startup_phases.time(('build',)):
+        db = InterpolatedMunsellColorDatabase()
+        try:
+            artifacts.save(artifact_name(), ARTIFACT_VERSION, artifact_sources(), db.to_arrays())
+        except OSError:
+            # Somewhere read-only, say; the database is just as good.
+            pass
+    return db
+
+
+class LazyDatabase():
+    """Stands in for a database until it's first used, then loads it
+    (once, even with several threads asking) and passes everything
+    through to it. Importing this module stays cheap."""
+    def __init__(self, load):
+        self._load = load
+        self._db = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._load()
+        return self._db
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+colors = LazyDatabase(load_colors)
+nearest_index = LazyDatabase(lambda: colors.get().nearest_index())
+
+
+def preload():
+    """Load the databases now rather than on first use. A server that
+    forks its workers from a loaded master (gunicorn --preload) then
+    loads them once, and every worker shares the master's copy."""
+    colors.get()
+    nearest_index.get()
+
+
+# Popular colors get looked up over and over, so resolved colors are
+# kept in a process-wide LRU cache, keyed on hue, value and chroma
+# rounded to CACHE_DIGITS places. Cached colors are shared; their
+# spectra are read-only.
+CACHE_DIGITS = 6
+spectrum_cache = lru.LRUCache(int(os.environ.get('MUNSELL_CACHE_SIZE', 4096)))
+
+def cache_key(hue, value, chroma):
+    return (round(hue, CACHE_DIGITS), round(value, CACHE_DIGITS), round(chroma, CACHE_DIGITS))
+
+def cached_color_for(hue, value, chroma):
+    """colors.get_color_for, through spectrum_cache."""
+    key = cache_key(hue, value, chroma)
+    col = spectrum_cache.get(key)
+    if col is None:
+        col = colors.get_color_for(hue, value, chroma)
+        col.spectrum.setflags(write=False)
+        spectrum_cache.put(key, col)
+    return col
+
+def resolve(munsell_colors):
+    """Resolve the spectra of many MunsellColors at once: cached colors
+    come from the cache, and the rest are interpolated together (and
+    cached). Colors that can't be found are
+    left unresolved, to raise MissingColorError when their spectrum is
+    asked for."""
+    misses = {}
+    for c in munsell_colors:
+        if c._spectrum is not None:
+            continue
+        key = cache_key(c.hue, c.value, c.chroma)
+        col = spectrum_cache.get(key)
+        if col is None:
+            misses.setdefault(key, []).append(c)
+        else:
+            c.resolve_from(col)
+    if not misses:
+        return
+    firsts = [group[0] for group in misses.values()]
+    spectra, chromas = colors.resolve_spectra(
+        [c.hue for c in firsts], [c.value for c in firsts], [c.chroma for c in firsts])
+    for (key, group), spectrum, chroma in zip(misses.items(), spectra, chromas.tolist()):
+        if np.isnan(chroma):
+            continue
+        col = MunsellSample(spectrum, group[0].hue, group[0].value, chroma)
+        col.spectrum.setflags(write=False)
+        spectrum_cache.put(key, col)
+        for c in group:
+            c.resolve_from(col)
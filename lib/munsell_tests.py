@@ -1,4 +1,6 @@
 import lib.munsell as munsell
+import lib.color as color
+import numpy as np
 import unittest
 
 
@@ -96,27 +98,36 @@ class TestComplement(unittest.TestCase):
         self.assertEquals(new_hue, 20)
 
 
+class TestParseName(unittest.TestCase):
+    def test_parse_name(self):
+        self.assertEqual(munsell.parse_name("5R 3/7"), ("5.0R", 3.0, 7.0))
+
+    def test_malformed_names(self):
+        for name in ["5.0R", "5.0Q 3/7", "5.0R x/7", None]:
+            with self.assertRaises(ValueError):
+                munsell.parse_name(name)
+
 class TestGetColorFor(unittest.TestCase):
     # Brittle tests, but it's someplace to start for refactoring db
     def test_direct_sample(self):
         new_color = munsell.colors.get_color_for(5, 5, 6)
-        self.assertListEqual(list(new_color.to_rgb()), [0.6733446600403031, 0.4058324881477391, 0.39677207929969144])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.6733446600403031, 0.4058324881477391, 0.39677207929969144], rtol=1e-12)
 
     def test_hue_interpolation(self):
         new_color = munsell.colors.get_color_for(5.5, 5, 6)
-        self.assertListEqual(list(new_color.to_rgb()), [0.674749439767226, 0.40717094319347696, 0.3912341887734641])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.674749439767226, 0.40717094319347696, 0.3912341887734641], rtol=1e-12)
 
     def test_value_interpolation(self):
         new_color = munsell.colors.get_color_for(5, 5.5, 6)
-        self.assertListEqual(list(new_color.to_rgb()), [0.724002585921689, 0.4562163455617211, 0.44522484509479693])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.724002585921689, 0.4562163455617211, 0.44522484509479693], rtol=1e-12)
 
     def test_chroma_interpolation(self):
         new_color = munsell.colors.get_color_for(5, 5, 5.5)
-        self.assertListEqual(list(new_color.to_rgb()), [0.6600346240464608, 0.41275205649334307, 0.4034785099114721])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.6600346240464608, 0.41275205649334307, 0.4034785099114721], rtol=1e-12)
 
     def test_multi_interpolation(self):
         new_color = munsell.colors.get_color_for(5.5, 5.5, 5.5)
-        self.assertListEqual(list(new_color.to_rgb()), [0.7094404463114915, 0.4628979516270451, 0.4457307548127278])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.7094404463114915, 0.4628979516270451, 0.4457307548127278], rtol=1e-12)
 
     def test_multi_interpolation_hvc(self):
         new_color = munsell.colors.get_color_for(5.5, 4.5, 3.5)
@@ -128,12 +139,66 @@ class TestGetColorFor(unittest.TestCase):
     def test_extreme_lows(self):
         new_color = munsell.colors.get_color_for(2, 1, 0)
         self.assertEqual(new_color.hue, 2)
-        self.assertListEqual(list(new_color.to_rgb()), [0.11650938827685081, 0.11650938827685069, 0.11650938827685073])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.11605768789161143, 0.11605768789161133, 0.11605768789161136], rtol=1e-12)
 
     def test_extreme_highs(self):
         new_color = munsell.colors.get_color_for(85, 7, 12)
         self.assertEqual(new_color.hue, 85)
-        self.assertListEqual(list(new_color.to_rgb()), [0.7668171130344671, 0.6399528239862932, 0.862195224973096])
+        np.testing.assert_allclose(new_color.to_rgb(), [0.7668171130344671, 0.6399528239862932, 0.862195224973096], rtol=1e-12)
+
+class TestGetSpectraFor(unittest.TestCase):
+    def test_matches_get_color_for(self):
+        hues = [5, 5.5, 5, 5, 5.5, 5.5, 2, 85, 99, 26.3]
+        values = [5, 5, 5.5, 5, 5.5, 4.5, 1, 7, 2.2, 8.5]
+        chromas = [6, 6, 6, 5.5, 5.5, 3.5, 0, 12, 30, 3]
+        spectra = munsell.colors.get_spectra_for(hues, values, chromas)
+        self.assertEqual(spectra.shape, (10, 36))
+        for spectrum, hvc in zip(spectra, zip(hues, values, chromas)):
+            expected = munsell.colors.get_color_for(*hvc).spectrum
+            np.testing.assert_allclose(spectrum, expected, rtol=1e-12)
+
+    def test_actual_chromas(self):
+        _, chromas = munsell.colors.resolve_spectra(["5R", "5R"], [5, 2], [6, 30])
+        self.assertEqual(chromas[0], 6)
+        self.assertEqual(chromas[1], munsell.colors.get_color_for(5, 2, 30).chroma)
+
+    def test_broadcasts(self):
+        spectra = munsell.colors.get_spectra_for(5, [[2], [5]], [0, 2, 4])
+        self.assertEqual(spectra.shape, (2, 3, 36))
+
+    def test_missing(self):
+        spectra = munsell.colors.get_spectra_for([5, 5], [5, 12], [6, 6])
+        self.assertFalse(np.isnan(spectra[0]).any())
+        self.assertTrue(np.isnan(spectra[1]).all())
+
+class TestArtifact(unittest.TestCase):
+    def test_round_trip(self):
+        db = munsell.InterpolatedMunsellColorDatabase.from_arrays(munsell.colors.to_arrays())
+        self.assertEqual(len(db.color_list), len(munsell.colors.color_list))
+        self.assertEqual(db.color_sample(5, 5, 6).name, "5.0R 5.0/6.0")
+        np.testing.assert_array_equal(
+            db.get_color_for(5.5, 4.5, 3.5).spectrum,
+            munsell.colors.get_color_for(5.5, 4.5, 3.5).spectrum)
+
+    def test_dense_grid(self):
+        grid, chromas = munsell.colors.dense_grid()
+        self.assertEqual(grid.shape, (len(munsell.GRID_HUES), len(munsell.GRID_VALUES), len(munsell.GRID_CHROMAS), 36))
+        self.assertEqual(chromas[3, 10, 6], 6)
+
+class TestSampleStore(unittest.TestCase):
+    def test_sample_is_a_view(self):
+        sample = munsell.colors.color_sample(5, 5, 6)
+        row = munsell.colors.lattice[munsell.colors.slot_for(5, 5, 6)]
+        self.assertTrue(np.shares_memory(sample.spectrum, munsell.colors.spectra[row]))
+        self.assertEqual((sample.hue, sample.value, sample.chroma), (5, 5, 6))
+        self.assertFalse(hasattr(sample, '__dict__'))
+
+    def test_whites_and_blacks(self):
+        black = munsell.colors.color_sample(62.5, 0, 2)
+        white = munsell.colors.color_sample(62.5, 10, 0)
+        self.assertEqual(black.name, munsell.colors.sample(1486).name)
+        self.assertEqual(white.name, munsell.colors.sample(1485).name)
+        np.testing.assert_array_equal(white.spectrum, munsell.colors.sample(1485).spectrum)
 
 class TestColorSampleExists(unittest.TestCase):
     def test_color_sample_exists(self):
@@ -141,10 +206,139 @@ class TestColorSampleExists(unittest.TestCase):
         self.assertEqual(munsell.colors.color_sample_exists(5.4, 5, 6), False)
         self.assertEqual(munsell.colors.color_sample_exists(5.2, 5.1, 6.1), False)
 
+    def test_partial_color_sample_exists(self):
+        self.assertEqual(munsell.colors.color_sample_exists(5), True)
+        self.assertEqual(munsell.colors.color_sample_exists(5, 8.5), False)
+        self.assertEqual(munsell.colors.color_sample_exists(5, 1), False)
+        self.assertEqual(munsell.colors.color_sample_exists(0), False)
+
+class TestColorSample(unittest.TestCase):
+    def test_color_sample(self):
+        sample = munsell.colors.color_sample(5, 5, 6)
+        self.assertEqual((sample.hue, sample.value, sample.chroma), (5, 5, 6))
+
+    def test_missing_color_sample(self):
+        with self.assertRaises(munsell.MissingColorError):
+            munsell.colors.color_sample(5, 2, 30)
+
+    def test_max_chroma_sample(self):
+        sample = munsell.colors.max_chroma_sample(5, 5)
+        self.assertFalse(munsell.colors.color_sample_exists(5, 5, sample.chroma + 2))
+
+class TestGamut(unittest.TestCase):
+    def test_table(self):
+        gamut = munsell.colors.gamut()
+        sample = munsell.colors.max_chroma_sample(5, 5)
+        self.assertEqual(gamut[munsell.hue_slot(5), munsell.value_slot(5)], sample.chroma)
+        self.assertEqual(gamut[munsell.hue_slot(5), munsell.value_slot(1)], -1)
+
+    def test_between_samples(self):
+        # The lowest of the edges of the samples it's interpolated from.
+        edges = [munsell.colors.max_chroma_for(hue, value) for hue in (5, 7.5) for value in (4, 5)]
+        self.assertEqual(munsell.colors.max_chroma_for(6, 4.5), min(edges))
+        self.assertEqual(munsell.colors.max_chromas([6], [4.5])[0], min(edges))
+
+    def test_outside(self):
+        self.assertTrue(np.isnan(munsell.colors.max_chroma_for(5, 11)))
+        self.assertTrue(np.isnan(munsell.colors.max_chromas(5, [11, -1])).all())
+
+    def test_clamps(self):
+        edge = munsell.colors.max_chroma_for(62.5, 2)
+        self.assertEqual(munsell.colors.get_color_for(62.5, 2, 30).chroma, edge)
+        self.assertEqual(munsell.colors.get_color_for(62.5, 2, edge + 0.005).chroma, edge)
+        _, chromas = munsell.colors.resolve_spectra([62.5, 62.5], 2, [30, edge - 1])
+        self.assertEqual(chromas.tolist(), [edge, edge - 1])
+
+    def test_gamut_stats(self):
+        stats = munsell.gamut_stats(["5R"], [5, 11])
+        self.assertEqual(stats[0]["hue"], "5.0R")
+        self.assertEqual(stats[0]["values"][0]["max_chroma"], munsell.colors.max_chroma_for(5, 5))
+        self.assertIsNone(stats[0]["values"][1]["max_chroma"])
+
 class MunsellColor(unittest.TestCase):
     def test_spectrum(self):
         self.assertEqual(len(munsell.MunsellColor("5R", 2, 2).spectrum), 36)
 
+    def test_spectrum_is_memoized(self):
+        c = munsell.MunsellColor("5R", 2, 30)
+        spectrum = c.spectrum
+        self.assertIs(c.spectrum, spectrum)
+        self.assertTrue(c.imprecise)
+        self.assertLess(c.actual_chroma, 30)
+
+    def test_spectrum_cache(self):
+        munsell.spectrum_cache.clear()
+        hits = munsell.spectrum_cache.hits
+        first = munsell.MunsellColor("5R", 4, 4).spectrum
+        second = munsell.MunsellColor("5.0R", 4.0, 4.0).spectrum
+        self.assertEqual(munsell.spectrum_cache.hits, hits + 1)
+        self.assertIs(first, second)
+
+    def test_resolve(self):
+        munsell.spectrum_cache.clear()
+        cached = munsell.MunsellColor("5R", 4, 4)
+        cached.spectrum
+        batch = [munsell.MunsellColor("5R", 4, 4), munsell.MunsellColor("5R", 2, 30),
+                 munsell.MunsellColor("5R", 2, 30), munsell.MunsellColor("5R", 12, 6)]
+        munsell.resolve(batch)
+        self.assertIs(batch[0].spectrum, cached.spectrum)
+        self.assertIs(batch[1].spectrum, batch[2].spectrum)
+        expected = munsell.colors.get_color_for(5, 2, 30)
+        np.testing.assert_allclose(batch[1].spectrum, expected.spectrum, rtol=1e-12)
+        self.assertEqual(batch[1].actual_chroma, expected.chroma)
+        with self.assertRaises(munsell.MissingColorError):
+            batch[3].spectrum
+
+    def test_page_stats(self):
+        expected = [x for row in munsell.page("2YR", 7, 5) for x in color.stats_dicts(row)]
+        stats = [x for row in munsell.page_stats(["2YR"], 7, 5)[0] for x in row]
+        self.assertEqual(len(stats), 35)
+        for swatch, expected_swatch in zip(stats, expected):
+            np.testing.assert_allclose(swatch.pop("rgb"), expected_swatch.pop("rgb"), rtol=1e-12)
+            self.assertEqual(swatch, expected_swatch)
+
+    def test_page_grid(self):
+        for steps in [2, 7, 81, 100]:
+            values, chromas = munsell.page_grid(steps, steps)
+            self.assertEqual((len(values), len(chromas)), (steps, steps))
+            self.assertEqual((values[-1], chromas[-1]), (9, 16))
+
+    def test_page_stats_are_cached(self):
+        first = munsell.page_stats([5, 30], 4, 4)
+        second = munsell.page_stats(["5.0R", 30], 4, 4)
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+
+    def test_nearest(self):
+        c = munsell.MunsellColor("5R", 4, 6)
+        lab = color.SpectrumBatch([c.spectrum]).to_lab()
+        by_lab = munsell.nearest_index.matches(*munsell.nearest_index.nearest_to_lab(lab, 2))
+        by_spectrum = munsell.nearest_index.matches(
+            *munsell.nearest_index.nearest_to_spectra([c.spectrum], 2))
+        for matches in [by_lab[0], by_spectrum[0]]:
+            self.assertEqual(matches[0]["name"], "5.0R 4.0/6.0")
+            self.assertLess(matches[0]["distance"], matches[1]["distance"])
+
+    def test_mix_hues(self):
+        proportions = np.array([0, 0.5, 1])
+        np.testing.assert_allclose(munsell.mix_hues(90, 10, proportions), [10, 0, 90])
+        np.testing.assert_allclose(munsell.mix_hues(40, 10, proportions), [10, 25, 40])
+        np.testing.assert_allclose(munsell.mix_hues(40, 10, proportions, False), [10, 75, 40])
+
+    def test_ladder_stats(self):
+        a, b = munsell.MunsellColor("7.5RP", 4, 14), munsell.MunsellColor("2.5R", 6, 8)
+        for method, ladder in (('munsell', munsell.numerical_ladder), ('mix', munsell.mix_ladder)):
+            expected = color.stats_dicts(ladder(a, b, 9))
+            stats = munsell.ladder_stats(a, b, 9, method)
+            self.assertEqual([x["name"] for x in stats], [x["name"] for x in expected])
+            np.testing.assert_allclose([x["rgb"] for x in stats], [x["rgb"] for x in expected], rtol=1e-12)
+
+    def test_stats_spans(self):
+        chunks = list(munsell.stats_spans(munsell.rainbow_span, (5, 10, 7, 0), 7, size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        expected = color.stats_dicts(munsell.rainbow(5, 10, 7))
+        self.assertEqual([x["name"] for chunk in chunks for x in chunk], [x["name"] for x in expected])
+
     def do_things_without_errors(self):
         # sloppy TODO
         r = munsell.MunsellColor("6.0GY", 1, 7)
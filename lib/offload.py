@@ -0,0 +1,162 @@
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import lib.metrics as metrics
+
+# Big grids and ladders can keep a web worker busy for a good fraction
+# of a second. With COMPUTE_WORKERS set, work bigger than THRESHOLD
+# colors is cut into chunks of about CHUNK_SIZE colors and run across
+# a pool of processes (one pool per web worker), and the results put
+# back together in order. The web worker just waits, so with threaded
+# workers (gunicorn --threads) cheap requests carry on meanwhile.
+#
+# Pool processes are forked from a worker that already has the Munsell
+# data (see start), or load it (from the artifact) before their first
+# piece of work. Forking a process that's running threads can leave the
+# children stuck on locks held at the time, so once there are threads a
+# new pool spawns fresh interpreters instead -- where Python lets us
+# choose, from 3.7. On 3.6, start() the pool before any threads.
+#
+# At most MAX_QUEUED chunks can be waiting at once; past that, new work
+# is turned away with Busy, and work that takes longer than TIMEOUT
+# seconds with TimedOut.
+#
+# Without COMPUTE_WORKERS (or with it 0) everything runs in place.
+
+WORKERS = int(os.environ.get('COMPUTE_WORKERS', 0))
+THRESHOLD = int(os.environ.get('COMPUTE_THRESHOLD', 2500))
+CHUNK_SIZE = int(os.environ.get('COMPUTE_CHUNK_SIZE', 1000))
+MAX_QUEUED = int(os.environ.get('COMPUTE_QUEUE', 8 * WORKERS))
+TIMEOUT = float(os.environ.get('COMPUTE_TIMEOUT', 30))
+
+offloads = metrics.Counter(
+    'compute_offloads_total', "Work sent to the compute pool, by how it went.",
+    labels=['outcome'])
+
+
+class Busy(Exception): pass
+class TimedOut(Exception): pass
+
+
+_executor = None
+_lock = threading.Lock()
+_queued = 0
+# Work submitted and not yet finished, to cancel on shutdown.
+_pending = set()
+_warm_pid = None
+
+
+def warm():
+    """Get a pool process ready for work, once: metrics of its own, and
+    the Munsell data loaded."""
+    global _warm_pid
+    if _warm_pid == os.getpid():
+        return
+    import lib.munsell as munsell
+    metrics.reset()
+    munsell.preload()
+    _warm_pid = os.getpid()
+
+def call(function, args):
+    warm()
+    result = function(*args)
+    # Pool processes keep metrics files of their own, like workers.
+    metrics.flush()
+    return result
+
+
+def executor():
+    """The pool, started if it hasn't been; None if there isn't one."""
+    global _executor
+    if WORKERS <= 0:
+        return None
+    with _lock:
+        if _executor is None:
+            if threading.active_count() > 1 and sys.version_info >= (3, 7):
+                _executor = concurrent.futures.ProcessPoolExecutor(
+                    WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _executor = concurrent.futures.ProcessPoolExecutor(WORKERS)
+        return _executor
+
+def start():
+    """Start the pool now, and wait until every process is up and warm,
+    rather than on the first big request. Best done before the worker
+    starts any threads of its own, so the processes can be forked."""
+    pool = executor()
+    if pool is not None:
+        concurrent.futures.wait([pool.submit(warm) for _ in range(WORKERS)])
+
+def shutdown(wait=False):
+    """Stop the pool, cancelling any work that hasn't started."""
+    global _executor
+    with _lock:
+        pool, _executor = _executor, None
+        pending = list(_pending)
+    for future in pending:
+        future.cancel()
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def spans(total, size):
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+def run(function, args, total, weight=1):
+    """function(*args, start, stop) for spans of range(total), joined
+    into one list in order; `function` returns a list of its items.
+    Each item is `weight` colors' work. Runs here unless there's a pool
+    and more than THRESHOLD colors to do."""
+    global _queued
+    pool = executor() if total * weight > THRESHOLD else None
+    if pool is None:
+        return function(*args, 0, total)
+
+    chunks = spans(total, max(1, CHUNK_SIZE // weight))
+    with _lock:
+        if _queued + len(chunks) > MAX_QUEUED:
+            offloads.inc(labels=('busy',))
+            raise Busy("Too much work is waiting already")
+        _queued += len(chunks)
+
+    def done(future):
+        global _queued
+        with _lock:
+            _queued -= 1
+            _pending.discard(future)
+
+    try:
+        futures = []
+        for start, stop in chunks:
+            future = pool.submit(call, function, tuple(args) + (start, stop))
+            with _lock:
+                _pending.add(future)
+            future.add_done_callback(done)
+            futures.append(future)
+    except BrokenProcessPool:
+        # A pool process died; start over with a new pool next time,
+        # and do this one here.
+        for _ in range(len(chunks) - len(futures)):
+            done(None)
+        shutdown()
+        offloads.inc(labels=('broken',))
+        return function(*args, 0, total)
+
+    finished, waiting = concurrent.futures.wait(futures, TIMEOUT)
+    if waiting:
+        for future in waiting:
+            future.cancel()
+        offloads.inc(labels=('timeout',))
+        raise TimedOut("That took too long")
+    try:
+        results = [future.result() for future in futures]
+    except BrokenProcessPool:
+        shutdown()
+        offloads.inc(labels=('broken',))
+        return function(*args, 0, total)
+    offloads.inc(labels=('done',))
+    return [item for result in results for item in result]
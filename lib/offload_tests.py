@@ -0,0 +1,93 @@
+import time
+import unittest
+
+import numpy as np
+
+import lib.munsell as munsell
+import lib.offload as offload
+
+
+def numbers(scale, start, stop):
+    return [scale * x for x in range(start, stop)]
+
+def slowly(start, stop):
+    time.sleep(0.5)
+    return list(range(start, stop))
+
+
+class TestOffload(unittest.TestCase):
+    def setUp(self):
+        self.settings = (offload.WORKERS, offload.THRESHOLD, offload.CHUNK_SIZE,
+                         offload.MAX_QUEUED, offload.TIMEOUT)
+        offload.WORKERS, offload.THRESHOLD, offload.CHUNK_SIZE = 2, 10, 4
+        offload.MAX_QUEUED, offload.TIMEOUT = 100, 10
+
+    def tearDown(self):
+        offload.shutdown(wait=True)
+        (offload.WORKERS, offload.THRESHOLD, offload.CHUNK_SIZE,
+         offload.MAX_QUEUED, offload.TIMEOUT) = self.settings
+
+    def test_spans(self):
+        self.assertEqual(offload.spans(10, 4), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(offload.spans(0, 4), [])
+
+    def test_in_order(self):
+        self.assertEqual(offload.run(numbers, (3,), 25), numbers(3, 0, 25))
+        self.assertIsNotNone(offload._executor)
+
+    def test_small_work_stays_here(self):
+        self.assertEqual(offload.run(numbers, (3,), 5), numbers(3, 0, 5))
+        self.assertIsNone(offload._executor)
+
+    def test_weight(self):
+        # Five items of three colors each is more than the threshold.
+        self.assertEqual(offload.run(numbers, (1,), 5, weight=3), numbers(1, 0, 5))
+        self.assertIsNotNone(offload._executor)
+
+    def test_no_pool(self):
+        offload.WORKERS = 0
+        self.assertEqual(offload.run(numbers, (1,), 50), numbers(1, 0, 50))
+        self.assertIsNone(offload._executor)
+
+    def test_busy(self):
+        offload.MAX_QUEUED = 3
+        with self.assertRaises(offload.Busy):
+            offload.run(numbers, (1,), 50)
+        self.assertEqual(offload._queued, 0)
+
+    def test_start(self):
+        offload.start()
+        self.assertEqual(offload.run(numbers, (2,), 25), numbers(2, 0, 25))
+
+    def test_shutdown_cancels(self):
+        offload.WORKERS = 1
+        offload.TIMEOUT = 0.1
+        with self.assertRaises(offload.TimedOut):
+            offload.run(slowly, (), 40)
+        offload.shutdown(wait=True)
+        self.assertEqual(offload._pending, set())
+        self.assertEqual(offload._queued, 0)
+
+    def test_timeout(self):
+        offload.TIMEOUT = 0.1
+        with self.assertRaises(offload.TimedOut):
+            offload.run(slowly, (), 20)
+
+    def test_grid(self):
+        offload.CHUNK_SIZE = 30
+        values, chromas = munsell.page_grid(5, 5)
+        pooled = munsell.grid_stats([25, 62.5], values, chromas)
+        offload.WORKERS = 0
+        self.assertEqual(pooled, munsell.grid_stats([25, 62.5], values, chromas))
+        self.assertEqual(np.shape(pooled)[:2], (2, 5))
+
+    def test_ladder(self):
+        a = munsell.MunsellColor("5R", 4, 12)
+        b = munsell.MunsellColor("5PB", 6, 8)
+        pooled = munsell.ladder_stats(a, b, 30, method='mix')
+        offload.WORKERS = 0
+        self.assertEqual(pooled, munsell.ladder_stats(a, b, 30, method='mix'))
+
+
+if __name__ == '__main__':
+    unittest.main()
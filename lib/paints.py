@@ -1,9 +1,10 @@
 import csv
 import numpy as np
-import math
 import os
 
+import lib.artifacts as artifacts
 import lib.color as color
+import lib.observers as observers
 
 # Data from 10.18236/econs2.201410 . It's shite and I hate it.
 # Same data as https://chsopensource.org/tools-2/pigments-checker/
@@ -14,25 +15,48 @@ OFFSET = 18
 DIVISOR = 750
 data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), './paints.csv')
 
-def load_paints(file=data_file):
-    paints = {}
+# The CSV is measured every 0.2nm or so; parsing and resampling all of
+# it on every import is slow, so the resampled spectra are saved as an
+# artifact (see lib/artifacts) and reused until the CSV changes. Bump
+# this whenever the way they're made changes.
+ARTIFACT_VERSION = 1
+
+
+def read_paints(file=data_file):
+    """Paint names, the wavelengths measured, and each paint's raw
+    readings (as rows)."""
     with open(file) as csvfile:
-        reader = csv.reader(csvfile)
-        arr = np.array([row for row in reader])
-    arr = arr.transpose()
-    spectra, frequencies = arr[1:, :], np.array([float(f) for f in arr[0, 1:]])
-    for paint in spectra:
-        paints[paint[0]] = (np.array([min(100+OFFSET, max(float(f), OFFSET + .001)) for f in paint[1:]]) - OFFSET)/DIVISOR
+        names = next(csv.reader(csvfile))[1:]
+        data = np.loadtxt(csvfile, delimiter=',', ndmin=2)
+    return names, data[:, 0], data[:, 1:].T
 
-    desired_frequencies = range(380, 731, 10)
-    for name in paints:
-        paints[name] = np.array([color.interpolate(frequencies, paints[name], x) for x in desired_frequencies])
+def load_paints(file=data_file, desired_frequencies=observers.frequencies):
+    """Paint reflectances, corrected and resampled to
+    `desired_frequencies`, by name; and those frequencies."""
+    names, frequencies, readings = read_paints(file)
+    spectra = (np.clip(readings, OFFSET + .001, 100 + OFFSET) - OFFSET) / DIVISOR
+    spectra = color.resample(frequencies, spectra, desired_frequencies)
+    return dict(zip(names, spectra)), np.array(desired_frequencies)
 
-    frequencies = np.array(desired_frequencies)
+def load_cached_paints():
+    """load_paints, from the artifact if it's current; otherwise loaded
+    from the CSV, and saved for next time if we can."""
+    arrays = artifacts.load('paints', ARTIFACT_VERSION, [data_file])
+    if arrays is not None:
+        return dict(zip(arrays['names'].tolist(), arrays['spectra'])), arrays['frequencies']
+    paints, frequencies = load_paints()
+    try:
+        artifacts.save('paints', ARTIFACT_VERSION, [data_file], {
+            'names': np.array(list(paints)),
+            'spectra': np.array(list(paints.values())),
+            'frequencies': frequencies,
+        })
+    except OSError:
+        pass
     return paints, frequencies
 
 
-paints, frequencies = load_paints()
+paints, frequencies = load_cached_paints()
 
 
 burnt_umber = color.Color(paints['burntumber'], 1, "Burnt Umber")
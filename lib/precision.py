@@ -0,0 +1,91 @@
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+# How far colors drift when spectra are float32 (SPECTRUM_PRECISION)
+# rather than float64. Each precision has to be set before lib.color is
+# imported, so each side runs in its own interpreter and saves what it
+# made; then the two are compared.
+#
+#     python -m lib.precision      (or `fab munsell.precision`)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRECISIONS = ('float64', 'float32')
+
+
+def sample(out):
+    """Save the rgb of every color on the Munsell grid, resolved and
+    converted as a page would be, and of every even mix of two paints,
+    in this process's precision."""
+    import lib.color as color
+    import lib.munsell as munsell
+    import lib.paints as paints
+
+    db = munsell.colors.get()
+    spectra, chromas = db.resolve_spectra(
+        munsell.GRID_HUES[:, None, None], munsell.GRID_VALUES[None, :, None], munsell.GRID_CHROMAS)
+    real = ~np.isnan(chromas)
+    _, grid_rgb, grid_rgb255 = color.SpectrumBatch(spectra[real]).rgb_arrays()
+
+    mixes = [color.Mix([color.Color(paints.paints[a]), color.Color(paints.paints[b])])
+             for a, b in itertools.combinations(sorted(paints.paints), 2)]
+    mix_rgb = np.array([mix.to_rgb() for mix in mixes])
+
+    np.savez(out, grid_rgb=grid_rgb, grid_rgb255=grid_rgb255,
+             mix_rgb=mix_rgb, mix_rgb255=(mix_rgb * 255).astype(int),
+             spectrum_bytes=db.spectra.nbytes + db.log_spectra.nbytes + db.grid.nbytes)
+
+
+def drift(reference, other, name):
+    rgb = np.abs(other[name + '_rgb'] - reference[name + '_rgb'])
+    rgb255 = np.abs(other[name + '_rgb255'] - reference[name + '_rgb255'])
+    return {
+        'colors': len(rgb),
+        'max_rgb': float(rgb.max()),
+        'max_rgb255': int(rgb255.max()),
+        'hex_changed': int((rgb255 > 0).any(axis=1).sum()),
+    }
+
+
+def report():
+    samples = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for precision in PRECISIONS:
+            out = os.path.join(tmp, precision + '.npz')
+            subprocess.check_call(
+                [sys.executable, '-m', 'lib.precision', 'sample', out], cwd=ROOT,
+                env=dict(os.environ, SPECTRUM_PRECISION=precision))
+            with np.load(out) as saved:
+                samples[precision] = dict(saved)
+    reference, other = samples['float64'], samples['float32']
+    return {
+        'grid': drift(reference, other, 'grid'),
+        'mixes': drift(reference, other, 'mix'),
+        'spectrum_bytes': {precision: int(samples[precision]['spectrum_bytes'])
+                           for precision in PRECISIONS},
+    }
+
+
+def main(argv):
+    if argv[:1] == ['sample'] and len(argv) == 2:
+        sample(argv[1])
+        return 0
+    results = report()
+    for name, title in (('grid', "Munsell grid"), ('mixes', "Even mixes of two paints")):
+        d = results[name]
+        print("{0}: {1} colors".format(title, d['colors']))
+        print("  max rgb drift     {0:.3g}".format(d['max_rgb']))
+        print("  max rgb255 drift  {0}".format(d['max_rgb255']))
+        print("  hex codes changed {0} ({1:.3%})".format(d['hex_changed'], d['hex_changed'] / d['colors']))
+    sizes = results['spectrum_bytes']
+    print("Munsell spectra: {0:.1f}MB as float64, {1:.1f}MB as float32".format(
+        sizes['float64'] / 1e6, sizes['float32'] / 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,136 @@
+import concurrent.futures
+import itertools
+import numpy as np
+import os
+
+import lib.color as color
+
+# Working backwards from a color to a recipe: the mix of pigments that
+# comes closest to it. Mixes are geometric means (see color.Mix), so a
+# mix's log spectrum is just the proportion-weighted sum of its
+# pigments' log spectra, and a whole batch of candidate mixes is one
+# array expression. Every set of up to MAX_PIGMENTS pigments is tried
+# on a coarse grid of proportions, which prunes the field down to the
+# REFINE_CANDIDATES most promising mixes; only those are refined, by
+# shifting paint from one pigment to another in shrinking steps.
+#
+# Error is delta E: distance in CIELAB, without clipping to the screen.
+
+MAX_PIGMENTS = 3
+COARSE_STEPS = 8
+REFINE_CANDIDATES = 64
+REFINE_ROUNDS = 24
+CHUNK_SIZE = 2 ** 15
+# Numpy lets go of the GIL for the heavy lifting, so chunks of the
+# coarse search can run on several threads at once.
+WORKERS = int(os.environ.get('RECIPE_WORKERS', 1))
+
+
+def target_lab(spectrum):
+    return color.SpectrumBatch([spectrum]).to_lab()[0]
+
+
+def mix_errors(log_spectra, pigments, proportions, lab):
+    """Delta E from `lab` of each mix, given (M, K) arrays of pigment
+    indices and their proportions (which sum to 1)."""
+    logs = np.einsum('mk,mkf->mf', proportions.astype(log_spectra.dtype), log_spectra[pigments])
+    mixed = color.SpectrumBatch(np.exp(logs)).to_lab()
+    return np.sqrt(((mixed - lab) ** 2).sum(axis=1))
+
+
+def proportion_grid(count, steps=COARSE_STEPS):
+    """Every way of splitting `steps` parts between `count` pigments,
+    each getting at least one part."""
+    splits = [split for split in itertools.product(range(1, steps + 1), repeat=count)
+              if sum(split) == steps]
+    return np.array(splits, dtype=float) / steps
+
+
+def coarse_search(log_spectra, lab, max_pigments, workers):
+    """Every recipe of up to `max_pigments` pigments, on the proportion
+    grid, as padded (M, max_pigments) pigment and proportion arrays,
+    with their errors."""
+    chunks = []
+    for count in range(1, max_pigments + 1):
+        subsets = np.array(list(itertools.combinations(range(len(log_spectra)), count)), dtype=int)
+        grid = proportion_grid(count)
+        pigments = np.repeat(subsets, len(grid), axis=0)
+        proportions = np.tile(grid, (len(subsets), 1))
+        pad = max_pigments - count
+        pigments = np.pad(pigments, ((0, 0), (0, pad)), mode='constant')
+        proportions = np.pad(proportions, ((0, 0), (0, pad)), mode='constant')
+        for start in range(0, len(pigments), CHUNK_SIZE):
+            chunks.append((pigments[start:start + CHUNK_SIZE], proportions[start:start + CHUNK_SIZE]))
+
+    def evaluate(chunk):
+        return mix_errors(log_spectra, chunk[0], chunk[1], lab)
+
+    if workers > 1 and len(chunks) > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            errors = list(pool.map(evaluate, chunks))
+    else:
+        errors = [evaluate(chunk) for chunk in chunks]
+    return (np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks]),
+            np.concatenate(errors))
+
+
+def refine(log_spectra, lab, pigments, proportions, errors):
+    """Compass search on proportions: each round, every candidate tries
+    moving `step` of its paint from each of its pigments to each other
+    one, keeps the best move, and halves its step when nothing helps."""
+    slots = pigments.shape[1]
+    used = proportions > 0
+    moves = [(i, j) for i in range(slots) for j in range(slots) if i != j]
+    if not moves:
+        return proportions, errors
+    shifts = np.zeros((len(moves), slots))
+    for m, (i, j) in enumerate(moves):
+        shifts[m, i] -= 1
+        shifts[m, j] += 1
+    steps = np.full(len(pigments), 0.5 / COARSE_STEPS)
+
+    for _ in range(REFINE_ROUNDS):
+        tried = proportions[:, None, :] + steps[:, None, None] * shifts[None, :, :]
+        # Stay on the candidate's own pigments, with nothing negative.
+        valid = (tried >= 0).all(axis=2) & ~(~used[:, None, :] & (shifts[None, :, :] != 0)).any(axis=2)
+        tried = np.clip(tried, 0, None)
+        tried_errors = mix_errors(
+            log_spectra,
+            np.repeat(pigments, len(moves), axis=0),
+            tried.reshape(-1, slots),
+            lab).reshape(len(pigments), len(moves))
+        tried_errors[~valid] = np.inf
+        best = tried_errors.argmin(axis=1)
+        best_errors = tried_errors[np.arange(len(pigments)), best]
+        better = best_errors < errors
+        proportions[better] = tried[better, best[better]]
+        errors[better] = best_errors[better]
+        steps[~better] /= 2
+    return proportions, errors
+
+
+def solve(log_spectra, lab, max_pigments=MAX_PIGMENTS, count=5, workers=WORKERS):
+    """The `count` best recipes for the CIELAB color `lab` from pigments
+    with the (K, 36) `log_spectra` (mixed in color.SPECTRUM_DTYPE), as (pigment indices, proportions,
+    delta E), best first. Recipes use at most `max_pigments` pigments;
+    ones that refine down to the same pigments appear once."""
+    log_spectra = np.asarray(log_spectra, dtype=color.SPECTRUM_DTYPE)
+    max_pigments = min(max_pigments, len(log_spectra))
+    pigments, proportions, errors = coarse_search(log_spectra, lab, max_pigments, workers)
+
+    keep = np.argpartition(errors, min(REFINE_CANDIDATES, len(errors)) - 1)[:REFINE_CANDIDATES]
+    pigments, proportions, errors = pigments[keep], proportions[keep], errors[keep]
+    proportions, errors = refine(log_spectra, lab, pigments, proportions, errors)
+
+    recipes = []
+    seen = set()
+    for n in np.argsort(errors, kind='stable'):
+        used = proportions[n] > 0
+        key = tuple(sorted(pigments[n][used].tolist()))
+        if key in seen:
+            continue
+        seen.add(key)
+        recipes.append((pigments[n][used].tolist(), proportions[n][used].tolist(), float(errors[n])))
+        if len(recipes) == count:
+            break
+    return recipes
@@ -0,0 +1,42 @@
+import lib.color as color
+import lib.paints as paints
+import lib.recipes as recipes
+import numpy as np
+import unittest
+
+
+class TestSolve(unittest.TestCase):
+    def setUp(self):
+        self.colors = [paints.titanium_white, paints.ultramarine, paints.cadmium_red,
+                       paints.yellow_ochre, paints.viridian, paints.ivory_black]
+        self.log_spectra = np.array([c.log_spectrum for c in self.colors])
+
+    def test_finds_a_known_mix(self):
+        mix = color.Mix([paints.titanium_white.p(3), paints.ultramarine.p(1), paints.cadmium_red.p(2)])
+        pigments, proportions, error = recipes.solve(self.log_spectra, recipes.target_lab(mix.spectrum))[0]
+        self.assertLess(error, 0.5)
+        self.assertAlmostEqual(sum(proportions), 1)
+
+    def test_single_pigment(self):
+        target = recipes.target_lab(paints.viridian.spectrum)
+        pigments, proportions, error = recipes.solve(self.log_spectra, target, max_pigments=1)[0]
+        self.assertEqual((pigments, proportions), ([4], [1.0]))
+        self.assertAlmostEqual(error, 0)
+
+    def test_recipes_are_sorted_and_distinct(self):
+        found = recipes.solve(self.log_spectra, recipes.target_lab(paints.yellow_ochre.spectrum * 0.5),
+                              max_pigments=2, count=6)
+        self.assertEqual(len(found), 6)
+        errors = [error for _, _, error in found]
+        self.assertEqual(errors, sorted(errors))
+        self.assertEqual(len(set(tuple(sorted(p)) for p, _, _ in found)), 6)
+        self.assertTrue(all(len(p) <= 2 for p, _, _ in found))
+
+    def test_workers_agree(self):
+        target = recipes.target_lab(paints.cadmium_red.spectrum * 0.8)
+        chunk_size, recipes.CHUNK_SIZE = recipes.CHUNK_SIZE, 64
+        try:
+            self.assertEqual(recipes.solve(self.log_spectra, target, workers=1),
+                             recipes.solve(self.log_spectra, target, workers=2))
+        finally:
+            recipes.CHUNK_SIZE = chunk_size
@@ -0,0 +1,15 @@
+from fabric.api import local, task
+
+
+@task
+def build():
+    """Builds the prebuilt Munsell spectra artifact"""
+    from lib.munsell import build_artifact
+    _, path = build_artifact()
+    print("Wrote %s" % path)
+
+
+@task
+def precision():
+    """Reports how far colors drift with float32 spectra"""
+    local("python -m lib.precision")
@@ -1,8 +1,21 @@
-from fabric.api import local, settings, hide, task
+import os
+import time
+
+from fabric.api import abort, local, settings, hide, task
 
 from config import config
 
 
+# Budgets, in milliseconds, for how long each of these takes to import
+# (cumulative, including everything it imports). See `fab test.imports`.
+IMPORT_BUDGETS = [
+    ('lib.color', 250),
+    ('lib.munsell', 300),
+    ('lib.paints', 300),
+    ('api', 1500),
+]
+
+
 @task
 def style():
     """Runs pep8 to check python standard style"""
@@ -28,6 +41,49 @@ def unit(args=""):
         local("honcho run -e .env.test nosetests --rednose %s" % args)
 
 
+def import_time(output, module):
+    """Cumulative import time of `module`, in ms, from the output of
+    `python -X importtime`."""
+    for line in output.splitlines():
+        parts = line.split('|')
+        if line.startswith('import time:') and parts[-1].strip() == module:
+            return int(parts[1]) / 1000.0
+
+
+@task
+def imports():
+    """Checks how long lib and api take to import against budgets"""
+    over = []
+    for module, budget in IMPORT_BUDGETS:
+        with hide("running"):
+            result = local("honcho run -e .env.test python -X importtime -c 'import %s'"
+                           % module, capture=True)
+        ms = import_time(result.stderr, module)
+        print("%-12s %8.1fms  (budget %dms)" % (module, ms, budget))
+        if ms > budget:
+            over.append(module)
+    if over:
+        abort("Over the import-time budget: %s" % ", ".join(over))
+
+
+@task
+def bench(output="", only=""):
+    """Runs the color engine benchmarks, saving results as JSON"""
+    if not output:
+        output = "lib/build/bench/%s.json" % time.strftime("%Y%m%d-%H%M%S")
+    if os.path.dirname(output):
+        local("mkdir -p %s" % os.path.dirname(output))
+    with hide("running"):
+        local("python -m lib.bench run %s %s" % (output, only))
+
+
+@task
+def bench_compare(before, after, threshold=""):
+    """Compares two benchmark runs, failing on regressions (default 10%)"""
+    with hide("running"):
+        local("python -m lib.bench compare %s %s %s" % (before, after, threshold))
+
+
 @task(default=True)
 def all():
     """Runs all tests; style, unit, and integration."""
@@ -37,6 +93,8 @@ def all():
         style()
         print("Testing units...")
         unit()
+        print("Testing import times...")
+        imports()
 
 
 @task